@@ -0,0 +1,66 @@
+#  CybroX-UserBot - telegram userbot
+#  Copyright (C) 2025 CybroX UserBot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Compare the legacy regex-sniffing decode with the type-tagged one
+
+Run from the repository root: python -m benchmarks.db_decode
+"""
+
+import json
+import timeit
+
+# Not utils.db, importing it would open the configured database
+from utils.codec import decode, encode, legacy_decode
+
+NOTES = {
+    f"note{i}": {"type": "text", "content": "some note text " * 20, "caption": ""}
+    for i in range(1000)
+}
+
+SAMPLES = {
+    "str": "No reason specified",
+    "int": 1735689600,
+    "float": 1735689600.123,
+    "bool": True,
+    "small json": [1, 2, 3],
+    "notes blob": NOTES,
+}
+
+
+def legacy_encode(value):
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def bench(func, arg, number):
+    best = min(timeit.repeat(lambda: func(*arg), number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main():
+    print(f"{'value':<12} {'legacy, us':>12} {'typed, us':>12} {'speedup':>8}")
+    for name, value in SAMPLES.items():
+        number = 20 if name == "notes blob" else 100000
+        legacy = bench(legacy_decode, (legacy_encode(value),), number)
+        typed = bench(decode, encode(value), number)
+        print(f"{name:<12} {legacy:>12.3f} {typed:>12.3f} {legacy / typed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -41,23 +41,35 @@
 # ]
 # ///
 import os
+import sys
 import logging
 import sqlite3
 import platform
 import subprocess
 
-from pyrogram import Client, idle, errors
-from pyrogram.enums.parse_mode import ParseMode
-from pyrogram.raw.functions.account import GetAuthorizations, DeleteAccount
-import requests
-import git
-
-from utils import config
-from utils.db import db
-from utils.misc import gitrepo, userbot_version
-from utils.scripts import restart
-from utils.rentry import rentry_cleanup_job
-from utils.module import ModuleManager
+from utils.profiler import profiler
+
+if "--profile-startup" in sys.argv:
+    profiler.enable_cprofile()
+
+with profiler.phase("import libraries"):
+    from pyrogram import Client, idle, errors
+    from pyrogram.enums.parse_mode import ParseMode
+    from pyrogram.raw.functions.account import GetAuthorizations, DeleteAccount
+    import requests
+    import git
+
+with profiler.phase("config"):
+    from utils import config
+with profiler.phase("database"):
+    from utils.db import db
+with profiler.phase("git repo"):
+    from utils.misc import commit_sha, userbot_version
+with profiler.phase("import utils"):
+    from utils.scripts import restart
+    from utils.rentry import rentry_cleanup_job
+    from utils.autodelete import delete_scheduler
+    from utils.module import ModuleManager
 
 SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
 if SCRIPT_PATH != os.getcwd():
@@ -69,7 +81,7 @@ common_params = {
     "hide_password": True,
     "workdir": SCRIPT_PATH,
     "app_version": userbot_version,
-    "device_model": f"CybroX-UserBot @ {gitrepo.head.commit.hexsha[:7]}",
+    "device_model": f"CybroX-UserBot @ {(commit_sha or 'unknown')[:7]}",
     "system_version": platform.version() + " " + platform.machine(),
     "sleep_threshold": 30,
     "test_mode": config.test_server,
@@ -124,7 +136,8 @@ async def main():
     DeleteAccount.__new__ = None
 
     try:
-        await app.start()
+        with profiler.phase("app.start"):
+            await app.start()
     except sqlite3.OperationalError as e:
         if str(e) == "database is locked" and os.name == "posix":
             logging.warning(
@@ -142,9 +155,11 @@ async def main():
         os.rename("./my_account.session", "./my_account.session-old")
         restart()
 
-    load_missing_modules()
+    with profiler.phase("missing modules"):
+        load_missing_modules()
     module_manager = ModuleManager.get_instance()
-    await module_manager.load_modules(app)
+    with profiler.phase("load modules"):
+        await module_manager.load_modules(app)
 
     if info := db.get("core.updater", "restart_info"):
         text = {
@@ -159,22 +174,27 @@ async def main():
 
     # required for sessionkiller module
     if db.get("core.sessionkiller", "enabled", False):
-        db.set(
-            "core.sessionkiller",
-            "auths_hashes",
-            [
-                auth.hash
-                for auth in (await app.invoke(GetAuthorizations())).authorizations
-            ],
-        )
+        with profiler.phase("sessionkiller"):
+            db.set(
+                "core.sessionkiller",
+                "auths_hashes",
+                [
+                    auth.hash
+                    for auth in (await app.invoke(GetAuthorizations())).authorizations
+                ],
+            )
 
+    profiler.finish(module_manager.load_times)
     logging.info("CybroX-UserBot started!")
 
     app.loop.create_task(rentry_cleanup_job())
+    app.loop.create_task(delete_scheduler.run(app))
 
     await idle()
 
     await app.stop()
+    # group commit may still hold writes
+    db.flush()
 
 
 if __name__ == "__main__":
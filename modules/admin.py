@@ -6,16 +6,40 @@
 #  the Free Software Foundation, either version 3 of the License, or
 #  (at your option) any later version.
 
+import re
 import asyncio
 from datetime import datetime, timedelta
 from typing import Optional, Union
 
 from pyrogram import Client, filters, errors
-from pyrogram.types import Message, ChatPermissions, ChatPrivileges
-from pyrogram.enums import ChatMemberStatus, ChatType
+from pyrogram.types import Message, ChatPermissions, ChatPrivileges, ChatMemberUpdated
+from pyrogram.enums import ChatMemberStatus, ChatType, ChatMembersFilter
 
 from utils.misc import modules_help, prefix
 from utils.scripts import edit_or_reply, with_reply
+from utils.cache import TTLCache
+from utils.ratelimit import scheduler
+from utils.resolver import resolver
+
+# Chat members keyed by (chat_id, user_id), kept fresh by member updates
+member_cache = TTLCache(4096, ttl=600)
+
+
+async def get_member(chat, user_id: int):
+    """Get a chat member, from the cache if possible"""
+    member = member_cache.get((chat.id, user_id))
+    if member is None:
+        member = await chat.get_member(user_id)
+        member_cache.set((chat.id, user_id), member)
+    return member
+
+
+@Client.on_chat_member_updated()
+async def member_updated_handler(client: Client, update: ChatMemberUpdated):
+    """Drop cached members whose status or privileges changed"""
+    member = update.new_chat_member or update.old_chat_member
+    if member and member.user:
+        member_cache.pop((update.chat.id, member.user.id))
 
 
 async def get_user(client: Client, message: Message) -> Optional[dict]:
@@ -27,13 +51,14 @@ async def get_user(client: Client, message: Message) -> Optional[dict]:
     if message.reply_to_message and message.reply_to_message.from_user:
         user_id = message.reply_to_message.from_user.id
         user_first_name = message.reply_to_message.from_user.first_name
+        await resolver.remember(message.reply_to_message.from_user)
     # If user_id is passed as argument
     elif len(message.command) > 1:
         arg = message.command[1]
         # Get user_id from username or user_id
         if arg.startswith("@"):
             try:
-                user = await client.get_users(arg)
+                user = await resolver.resolve(client, arg)
                 user_id = user.id
                 user_first_name = user.first_name
             except (errors.PeerIdInvalid, ValueError):
@@ -42,14 +67,14 @@ async def get_user(client: Client, message: Message) -> Optional[dict]:
             try:
                 user_id = int(arg)
                 try:
-                    user = await client.get_users(user_id)
+                    user = await resolver.resolve(client, user_id)
                     user_first_name = user.first_name
                 except errors.PeerIdInvalid:
                     return None
             except ValueError:
                 # Maybe username without @
                 try:
-                    user = await client.get_users(arg)
+                    user = await resolver.resolve(client, arg)
                     user_id = user.id
                     user_first_name = user.first_name
                 except (errors.PeerIdInvalid, ValueError):
@@ -61,6 +86,128 @@ async def get_user(client: Client, message: Message) -> Optional[dict]:
     return {"user_id": user_id, "user_first_name": user_first_name}
 
 
+# Durations like 30, 10m, 12h or 7d; longer numbers are taken as user ids
+DURATION_RE = re.compile(r"^\d{1,4}[mhd]?$")
+# How many moderation requests of one bulk command run at the same time
+BULK_CONCURRENCY = 5
+
+MUTED_PERMISSIONS = ChatPermissions(
+    can_send_messages=False,
+    can_send_media_messages=False,
+    can_send_other_messages=False,
+    can_add_web_page_previews=False,
+    can_send_polls=False,
+    can_change_info=False,
+    can_invite_users=False,
+    can_pin_messages=False
+)
+
+
+def is_user_ref(arg: str) -> bool:
+    digits = arg.lstrip("-")
+    return arg.startswith("@") or (digits.isdigit() and len(digits) >= 5)
+
+
+def parse_duration(args: list) -> tuple:
+    """Split command arguments into (seconds, reason)"""
+    if args and DURATION_RE.match(args[0]):
+        time_str = args[0]
+        multiplier = {"m": 60, "h": 3600, "d": 86400}.get(time_str[-1], 1)
+        return int(time_str.rstrip("mhd")) * multiplier, " ".join(args[1:])
+    return 0, " ".join(args)
+
+
+def format_duration(seconds: int) -> str:
+    if seconds >= 86400:
+        return f"{seconds // 86400} days"
+    elif seconds >= 3600:
+        return f"{seconds // 3600} hours"
+    return f"{seconds // 60} minutes"
+
+
+async def get_targets(client: Client, message: Message) -> Union[tuple, bool, None]:
+    """Collect the users of a bulk moderation command
+
+    Targets are several usernames/ids, "range" (everyone who wrote between
+    the replied message and the command) or "joined N" (members who joined
+    in the last N minutes). Returns (targets, failures, remaining args),
+    None if the command names a single user, or False if "range" or
+    "joined" was used wrong and a usage error has been shown.
+    """
+    args = message.command[1:]
+    chat_id = message.chat.id
+    keyword = args[0].lower() if args else None
+    
+    if keyword == "range":
+        if not message.reply_to_message:
+            await edit_or_reply(message, "❌ <b>Reply to the first message of the range!</b>")
+            return False
+        senders = {}
+        async for msg in client.get_chat_history(chat_id, offset_id=message.id):
+            if msg.id < message.reply_to_message.id:
+                break
+            if msg.from_user and not msg.from_user.is_self:
+                senders[msg.from_user.id] = msg.from_user.first_name
+        return list(senders.items()), [], args[1:]
+    
+    if keyword == "joined":
+        if len(args) < 2 or not args[1].isdigit():
+            await edit_or_reply(message, f"❌ <b>Usage:</b> <code>{prefix}{message.command[0]} joined [minutes]</code>")
+            return False
+        since = datetime.now() - timedelta(minutes=int(args[1]))
+        members = {}
+        # Recent members come newest-joined first
+        async for member in client.get_chat_members(chat_id, filter=ChatMembersFilter.RECENT):
+            if member.joined_date and member.joined_date < since:
+                break
+            if member.status == ChatMemberStatus.MEMBER and member.joined_date:
+                members[member.user.id] = member.user.first_name
+        return list(members.items()), [], args[2:]
+    
+    refs = []
+    while args and is_user_ref(args[0]):
+        refs.append(args.pop(0))
+    if len(refs) < 2:
+        return None
+    
+    users = await asyncio.gather(
+        *(resolver.resolve(client, ref) for ref in refs),
+        return_exceptions=True
+    )
+    targets, failures = {}, []
+    for ref, user in zip(refs, users):
+        if isinstance(user, Exception):
+            failures.append(f"{ref}: not found")
+        else:
+            targets[user.id] = user.first_name
+    return list(targets.items()), failures, args
+
+
+async def run_bulk(message: Message, targets: list, failures: list, action, title: str, details: str = ""):
+    """Run action(user_id) for every target concurrently and report once"""
+    msg = await edit_or_reply(message, f"<b>⏳ Processing {len(targets)} users...</b>")
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+    
+    async def run(user_id: int, first_name: str):
+        async with semaphore:
+            try:
+                await action(user_id)
+            except Exception as e:
+                return f"{first_name or user_id}: {e}"
+    
+    errors = [error for error in await asyncio.gather(*(run(*target) for target in targets)) if error]
+    
+    text = f"<b>{title} {len(targets) - len(errors)}/{len(targets) + len(failures)} users!</b>\n\n"
+    text += f"<b>Chat:</b> {message.chat.title}\n"
+    text += details
+    errors = failures + errors
+    if errors:
+        text += "\n<b>Failed:</b>\n" + "\n".join(f"• {error}" for error in errors[:10])
+        if len(errors) > 10:
+            text += f"\n• ...and {len(errors) - 10} more"
+    await scheduler.call("edit", msg.edit, text, chat=msg.chat.id)
+
+
 async def check_privileges(client: Client, message: Message, privileges: list) -> bool:
     """Check bot and user privileges in chat"""
     chat = message.chat
@@ -72,7 +219,7 @@ async def check_privileges(client: Client, message: Message, privileges: list) -
     
     # Check if bot has required privileges
     try:
-        bot_member = await chat.get_member(client.me.id)
+        bot_member = await get_member(chat, client.me.id)
     except errors.ChatAdminRequired:
         await edit_or_reply(message, "❌ <b>I'm not an admin in this chat!</b>")
         return False
@@ -89,9 +236,13 @@ async def check_privileges(client: Client, message: Message, privileges: list) -
         )
         return False
     
-    # Check if user has required privileges
+    # Check if user has required privileges; commands are usually our own,
+    # in which case the member fetched above already answers this
     try:
-        user_member = await chat.get_member(message.from_user.id)
+        if message.from_user.id == client.me.id:
+            user_member = bot_member
+        else:
+            user_member = await get_member(chat, message.from_user.id)
     except errors.UserNotParticipant:
         await edit_or_reply(message, "❌ <b>You're not even in this chat!</b>")
         return False
@@ -105,10 +256,34 @@ async def check_privileges(client: Client, message: Message, privileges: list) -
 
 @Client.on_message(filters.command("ban", prefix) & filters.me)
 async def ban_cmd(client: Client, message: Message):
-    """Ban user from chat"""
+    """Ban one or more users from chat"""
     if not await check_privileges(client, message, ["can_restrict_members"]):
         return
     
+    bulk = await get_targets(client, message)
+    if bulk is False:
+        return
+    if bulk is not None:
+        targets, failures, args = bulk
+        ban_time, reason = parse_duration(args)
+        until_date = datetime.now() + timedelta(seconds=ban_time) if ban_time else datetime.fromtimestamp(0)
+        
+        async def ban(user_id: int):
+            await scheduler.call(
+                "restrict",
+                client.ban_chat_member,
+                message.chat.id,
+                user_id,
+                until_date=until_date,
+                chat=message.chat.id
+            )
+        
+        details = f"<b>Duration:</b> {format_duration(ban_time) if ban_time else 'forever'}\n"
+        if reason:
+            details += f"<b>Reason:</b> {reason}\n"
+        await run_bulk(message, targets, failures, ban, "🔨 Banned", details)
+        return
+    
     user_dict = await get_user(client, message)
     if not user_dict:
         await edit_or_reply(message, "❌ <b>User not found!</b>")
@@ -146,10 +321,13 @@ async def ban_cmd(client: Client, message: Message):
         
         if ban_time > 0:
             ban_until_date = datetime.now() + timedelta(seconds=ban_time)
-            await client.ban_chat_member(
+            await scheduler.call(
+                "restrict",
+                client.ban_chat_member,
                 chat_id=message.chat.id, 
                 user_id=user_id,
-                until_date=ban_until_date
+                until_date=ban_until_date,
+                chat=message.chat.id
             )
             
             # Format time
@@ -163,9 +341,12 @@ async def ban_cmd(client: Client, message: Message):
                 
             ban_text = f"<b>🔨 User banned for {time_text}!</b>"
         else:
-            await client.ban_chat_member(
+            await scheduler.call(
+                "restrict",
+                client.ban_chat_member,
                 chat_id=message.chat.id, 
-                user_id=user_id
+                user_id=user_id,
+                chat=message.chat.id
             )
             ban_text = "<b>🔨 User banned permanently!</b>"
         
@@ -178,14 +359,16 @@ async def ban_cmd(client: Client, message: Message):
         if reason:
             text += f"\n<b>Reason:</b> {reason}"
             
-        await msg.edit(text)
+        await scheduler.call("edit", msg.edit, text, chat=msg.chat.id)
         
     except errors.ChatAdminRequired:
-        await msg.edit("❌ <b>I don't have permission to ban users!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "❌ <b>I don't have permission to ban users!</b>", chat=msg.chat.id
+        )
     except errors.UserAdminInvalid:
-        await msg.edit("❌ <b>I can't ban an admin!</b>")
+        await scheduler.call("edit", msg.edit, "❌ <b>I can't ban an admin!</b>", chat=msg.chat.id)
     except Exception as e:
-        await msg.edit(f"❌ <b>Error:</b> {e}")
+        await scheduler.call("edit", msg.edit, f"❌ <b>Error:</b> {e}", chat=msg.chat.id)
 
 
 @Client.on_message(filters.command("unban", prefix) & filters.me)
@@ -206,9 +389,12 @@ async def unban_cmd(client: Client, message: Message):
     try:
         msg = await edit_or_reply(message, "<b>🔄 Unbanning user...</b>")
         
-        await client.unban_chat_member(
+        await scheduler.call(
+            "restrict",
+            client.unban_chat_member,
             chat_id=message.chat.id, 
-            user_id=user_id
+            user_id=user_id,
+            chat=message.chat.id
         )
         
         # Success message
@@ -217,20 +403,41 @@ async def unban_cmd(client: Client, message: Message):
         text += f"<b>User:</b> {user_first_name}\n"
         text += f"<b>ID:</b> <code>{user_id}</code>"
             
-        await msg.edit(text)
+        await scheduler.call("edit", msg.edit, text, chat=msg.chat.id)
         
     except errors.ChatAdminRequired:
-        await msg.edit("❌ <b>I don't have permission to unban users!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "❌ <b>I don't have permission to unban users!</b>", chat=msg.chat.id
+        )
     except Exception as e:
-        await msg.edit(f"❌ <b>Error:</b> {e}")
+        await scheduler.call("edit", msg.edit, f"❌ <b>Error:</b> {e}", chat=msg.chat.id)
 
 
 @Client.on_message(filters.command("kick", prefix) & filters.me)
 async def kick_cmd(client: Client, message: Message):
-    """Kick user from chat"""
+    """Kick one or more users from chat"""
     if not await check_privileges(client, message, ["can_restrict_members"]):
         return
     
+    bulk = await get_targets(client, message)
+    if bulk is False:
+        return
+    if bulk is not None:
+        targets, failures, args = bulk
+        reason = " ".join(args)
+        
+        async def kick(user_id: int):
+            await scheduler.call(
+                "restrict", client.ban_chat_member, message.chat.id, user_id, chat=message.chat.id
+            )
+            await scheduler.call(
+                "restrict", client.unban_chat_member, message.chat.id, user_id, chat=message.chat.id
+            )
+        
+        details = f"<b>Reason:</b> {reason}\n" if reason else ""
+        await run_bulk(message, targets, failures, kick, "👢 Kicked", details)
+        return
+    
     user_dict = await get_user(client, message)
     if not user_dict:
         await edit_or_reply(message, "❌ <b>User not found!</b>")
@@ -248,15 +455,21 @@ async def kick_cmd(client: Client, message: Message):
     try:
         msg = await edit_or_reply(message, "<b>👢 Kicking user...</b>")
         
-        await client.ban_chat_member(
+        await scheduler.call(
+            "restrict",
+            client.ban_chat_member,
             chat_id=message.chat.id, 
-            user_id=user_id
+            user_id=user_id,
+            chat=message.chat.id
         )
         
         # Immediately unban to just kick
-        await client.unban_chat_member(
+        await scheduler.call(
+            "restrict",
+            client.unban_chat_member,
             chat_id=message.chat.id, 
-            user_id=user_id
+            user_id=user_id,
+            chat=message.chat.id
         )
         
         # Success message
@@ -268,22 +481,49 @@ async def kick_cmd(client: Client, message: Message):
         if reason:
             text += f"\n<b>Reason:</b> {reason}"
             
-        await msg.edit(text)
+        await scheduler.call("edit", msg.edit, text, chat=msg.chat.id)
         
     except errors.ChatAdminRequired:
-        await msg.edit("❌ <b>I don't have permission to kick users!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "❌ <b>I don't have permission to kick users!</b>", chat=msg.chat.id
+        )
     except errors.UserAdminInvalid:
-        await msg.edit("❌ <b>I can't kick an admin!</b>")
+        await scheduler.call("edit", msg.edit, "❌ <b>I can't kick an admin!</b>", chat=msg.chat.id)
     except Exception as e:
-        await msg.edit(f"❌ <b>Error:</b> {e}")
+        await scheduler.call("edit", msg.edit, f"❌ <b>Error:</b> {e}", chat=msg.chat.id)
 
 
 @Client.on_message(filters.command("mute", prefix) & filters.me)
 async def mute_cmd(client: Client, message: Message):
-    """Mute user in chat"""
+    """Mute one or more users in chat"""
     if not await check_privileges(client, message, ["can_restrict_members"]):
         return
     
+    bulk = await get_targets(client, message)
+    if bulk is False:
+        return
+    if bulk is not None:
+        targets, failures, args = bulk
+        mute_time, reason = parse_duration(args)
+        until_date = datetime.now() + timedelta(seconds=mute_time) if mute_time else datetime.fromtimestamp(0)
+        
+        async def mute(user_id: int):
+            await scheduler.call(
+                "restrict",
+                client.restrict_chat_member,
+                message.chat.id,
+                user_id,
+                MUTED_PERMISSIONS,
+                until_date=until_date,
+                chat=message.chat.id
+            )
+        
+        details = f"<b>Duration:</b> {format_duration(mute_time) if mute_time else 'forever'}\n"
+        if reason:
+            details += f"<b>Reason:</b> {reason}\n"
+        await run_bulk(message, targets, failures, mute, "🔇 Muted", details)
+        return
+    
     user_dict = await get_user(client, message)
     if not user_dict:
         await edit_or_reply(message, "❌ <b>User not found!</b>")
@@ -318,24 +558,18 @@ async def mute_cmd(client: Client, message: Message):
     try:
         msg = await edit_or_reply(message, "<b>🔇 Muting user...</b>")
         
-        permissions = ChatPermissions(
-            can_send_messages=False,
-            can_send_media_messages=False,
-            can_send_other_messages=False,
-            can_add_web_page_previews=False,
-            can_send_polls=False,
-            can_change_info=False,
-            can_invite_users=False,
-            can_pin_messages=False
-        )
+        permissions = MUTED_PERMISSIONS
         
         if mute_time > 0:
             mute_until_date = datetime.now() + timedelta(seconds=mute_time)
-            await client.restrict_chat_member(
+            await scheduler.call(
+                "restrict",
+                client.restrict_chat_member,
                 chat_id=message.chat.id, 
                 user_id=user_id,
                 permissions=permissions,
-                until_date=mute_until_date
+                until_date=mute_until_date,
+                chat=message.chat.id
             )
             
             # Format time
@@ -349,10 +583,13 @@ async def mute_cmd(client: Client, message: Message):
                 
             mute_text = f"<b>🔇 User muted for {time_text}!</b>"
         else:
-            await client.restrict_chat_member(
+            await scheduler.call(
+                "restrict",
+                client.restrict_chat_member,
                 chat_id=message.chat.id, 
                 user_id=user_id,
-                permissions=permissions
+                permissions=permissions,
+                chat=message.chat.id
             )
             mute_text = "<b>🔇 User muted permanently!</b>"
         
@@ -365,14 +602,16 @@ async def mute_cmd(client: Client, message: Message):
         if reason:
             text += f"\n<b>Reason:</b> {reason}"
             
-        await msg.edit(text)
+        await scheduler.call("edit", msg.edit, text, chat=msg.chat.id)
         
     except errors.ChatAdminRequired:
-        await msg.edit("❌ <b>I don't have permission to mute users!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "❌ <b>I don't have permission to mute users!</b>", chat=msg.chat.id
+        )
     except errors.UserAdminInvalid:
-        await msg.edit("❌ <b>I can't mute an admin!</b>")
+        await scheduler.call("edit", msg.edit, "❌ <b>I can't mute an admin!</b>", chat=msg.chat.id)
     except Exception as e:
-        await msg.edit(f"❌ <b>Error:</b> {e}")
+        await scheduler.call("edit", msg.edit, f"❌ <b>Error:</b> {e}", chat=msg.chat.id)
 
 
 @Client.on_message(filters.command("unmute", prefix) & filters.me)
@@ -401,10 +640,13 @@ async def unmute_cmd(client: Client, message: Message):
             can_send_polls=True
         )
         
-        await client.restrict_chat_member(
+        await scheduler.call(
+            "restrict",
+            client.restrict_chat_member,
             chat_id=message.chat.id, 
             user_id=user_id,
-            permissions=permissions
+            permissions=permissions,
+            chat=message.chat.id
         )
         
         # Success message
@@ -413,12 +655,14 @@ async def unmute_cmd(client: Client, message: Message):
         text += f"<b>User:</b> {user_first_name}\n"
         text += f"<b>ID:</b> <code>{user_id}</code>"
             
-        await msg.edit(text)
+        await scheduler.call("edit", msg.edit, text, chat=msg.chat.id)
         
     except errors.ChatAdminRequired:
-        await msg.edit("❌ <b>I don't have permission to unmute users!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "❌ <b>I don't have permission to unmute users!</b>", chat=msg.chat.id
+        )
     except Exception as e:
-        await msg.edit(f"❌ <b>Error:</b> {e}")
+        await scheduler.call("edit", msg.edit, f"❌ <b>Error:</b> {e}", chat=msg.chat.id)
 
 
 @Client.on_message(filters.command("pin", prefix) & filters.me)
@@ -441,18 +685,25 @@ async def pin_cmd(client: Client, message: Message):
     try:
         msg = await edit_or_reply(message, "<b>📌 Pinning message...</b>")
         
-        await client.pin_chat_message(
+        await scheduler.call(
+            "other",
+            client.pin_chat_message,
             chat_id=message.chat.id,
             message_id=replied.id,
-            disable_notification=silent
+            disable_notification=silent,
+            chat=message.chat.id
         )
         
-        await msg.edit("<b>📌 Message pinned successfully!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "<b>📌 Message pinned successfully!</b>", chat=msg.chat.id
+        )
         
     except errors.ChatAdminRequired:
-        await msg.edit("❌ <b>I don't have permission to pin messages!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "❌ <b>I don't have permission to pin messages!</b>", chat=msg.chat.id
+        )
     except Exception as e:
-        await msg.edit(f"❌ <b>Error:</b> {e}")
+        await scheduler.call("edit", msg.edit, f"❌ <b>Error:</b> {e}", chat=msg.chat.id)
 
 
 @Client.on_message(filters.command("unpin", prefix) & filters.me)
@@ -466,16 +717,28 @@ async def unpin_cmd(client: Client, message: Message):
         try:
             msg = await edit_or_reply(message, "<b>🔄 Unpinning all messages...</b>")
             
-            await client.unpin_all_chat_messages(chat_id=message.chat.id)
+            await scheduler.call(
+                "other",
+                client.unpin_all_chat_messages,
+                chat_id=message.chat.id,
+                chat=message.chat.id
+            )
             
-            await msg.edit("<b>📌 All messages unpinned!</b>")
+            await scheduler.call(
+                "edit", msg.edit, "<b>📌 All messages unpinned!</b>", chat=msg.chat.id
+            )
             return
             
         except errors.ChatAdminRequired:
-            await msg.edit("❌ <b>I don't have permission to unpin messages!</b>")
+            await scheduler.call(
+                "edit",
+                msg.edit,
+                "❌ <b>I don't have permission to unpin messages!</b>",
+                chat=msg.chat.id
+            )
             return
         except Exception as e:
-            await msg.edit(f"❌ <b>Error:</b> {e}")
+            await scheduler.call("edit", msg.edit, f"❌ <b>Error:</b> {e}", chat=msg.chat.id)
             return
     
     # Regular unpin (latest or replied)
@@ -485,20 +748,30 @@ async def unpin_cmd(client: Client, message: Message):
         msg = await edit_or_reply(message, "<b>🔄 Unpinning message...</b>")
         
         if replied:
-            await client.unpin_chat_message(
+            await scheduler.call(
+                "other",
+                client.unpin_chat_message,
                 chat_id=message.chat.id,
-                message_id=replied.id
+                message_id=replied.id,
+                chat=message.chat.id
             )
         else:
             # Unpin the last pinned message
-            await client.unpin_chat_message(chat_id=message.chat.id)
+            await scheduler.call(
+                "other", client.unpin_chat_message, chat_id=message.chat.id, chat=message.chat.id
+            )
         
-        await msg.edit("<b>📌 Message unpinned!</b>")
+        await scheduler.call("edit", msg.edit, "<b>📌 Message unpinned!</b>", chat=msg.chat.id)
         
     except errors.ChatAdminRequired:
-        await msg.edit("❌ <b>I don't have permission to unpin messages!</b>")
+        await scheduler.call(
+            "edit",
+            msg.edit,
+            "❌ <b>I don't have permission to unpin messages!</b>",
+            chat=msg.chat.id
+        )
     except Exception as e:
-        await msg.edit(f"❌ <b>Error:</b> {e}")
+        await scheduler.call("edit", msg.edit, f"❌ <b>Error:</b> {e}", chat=msg.chat.id)
 
 
 @Client.on_message(filters.command("promote", prefix) & filters.me)
@@ -543,18 +816,25 @@ async def promote_cmd(client: Client, message: Message):
             can_pin_messages=True
         )
         
-        await client.promote_chat_member(
+        await scheduler.call(
+            "restrict",
+            client.promote_chat_member,
             chat_id=message.chat.id,
             user_id=user_id,
-            privileges=privileges
+            privileges=privileges,
+            chat=message.chat.id
         )
+        member_cache.pop((message.chat.id, user_id))
         
         # Set admin title if provided
         if custom_title:
-            await client.set_administrator_title(
+            await scheduler.call(
+                "other",
+                client.set_administrator_title,
                 chat_id=message.chat.id,
                 user_id=user_id,
-                title=custom_title
+                title=custom_title,
+                chat=message.chat.id
             )
         
         # Success message
@@ -566,14 +846,18 @@ async def promote_cmd(client: Client, message: Message):
         if custom_title:
             text += f"\n<b>Title:</b> {custom_title}"
             
-        await msg.edit(text)
+        await scheduler.call("edit", msg.edit, text, chat=msg.chat.id)
         
     except errors.ChatAdminRequired:
-        await msg.edit("❌ <b>I don't have permission to promote users!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "❌ <b>I don't have permission to promote users!</b>", chat=msg.chat.id
+        )
     except errors.UserAdminInvalid:
-        await msg.edit("❌ <b>Cannot promote an admin!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "❌ <b>Cannot promote an admin!</b>", chat=msg.chat.id
+        )
     except Exception as e:
-        await msg.edit(f"❌ <b>Error:</b> {e}")
+        await scheduler.call("edit", msg.edit, f"❌ <b>Error:</b> {e}", chat=msg.chat.id)
 
 
 @Client.on_message(filters.command("demote", prefix) & filters.me)
@@ -593,11 +877,15 @@ async def demote_cmd(client: Client, message: Message):
     try:
         msg = await edit_or_reply(message, "<b>👑 Demoting user...</b>")
         
-        await client.promote_chat_member(
+        await scheduler.call(
+            "restrict",
+            client.promote_chat_member,
             chat_id=message.chat.id,
             user_id=user_id,
-            privileges=ChatPrivileges()  # Empty privileges = demote
+            privileges=ChatPrivileges(),  # Empty privileges = demote
+            chat=message.chat.id
         )
+        member_cache.pop((message.chat.id, user_id))
         
         # Success message
         text = f"<b>⬇️ User demoted!</b>\n\n"
@@ -605,21 +893,26 @@ async def demote_cmd(client: Client, message: Message):
         text += f"<b>User:</b> {user_first_name}\n"
         text += f"<b>ID:</b> <code>{user_id}</code>"
             
-        await msg.edit(text)
+        await scheduler.call("edit", msg.edit, text, chat=msg.chat.id)
         
     except errors.ChatAdminRequired:
-        await msg.edit("❌ <b>I don't have permission to demote users!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "❌ <b>I don't have permission to demote users!</b>", chat=msg.chat.id
+        )
     except errors.UserAdminInvalid:
-        await msg.edit("❌ <b>Cannot demote this user!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "❌ <b>Cannot demote this user!</b>", chat=msg.chat.id
+        )
     except Exception as e:
-        await msg.edit(f"❌ <b>Error:</b> {e}")
+        await scheduler.call("edit", msg.edit, f"❌ <b>Error:</b> {e}", chat=msg.chat.id)
 
 
 modules_help["admin"] = {
     "ban [user] [time] [reason]": "Ban user from chat (time format: 10m, 10h, 10d)",
+    "ban [users...] [time] [reason]": "Ban several users at once; users can also be 'range' (reply: everyone who wrote since) or 'joined [minutes]'",
     "unban [user]": "Unban user from chat",
-    "kick [user] [reason]": "Kick user from chat",
-    "mute [user] [time] [reason]": "Mute user in chat (time format: 10m, 10h, 10d)",
+    "kick [user] [reason]": "Kick user from chat (accepts several users, 'range' or 'joined [minutes]' like ban)",
+    "mute [user] [time] [reason]": "Mute user in chat (time format: 10m, 10h, 10d; accepts several users, 'range' or 'joined [minutes]' like ban)",
     "unmute [user]": "Unmute user in chat",
     "pin [silent]": "Pin replied message (add 'silent' to pin without notification)",
     "unpin": "Unpin replied message or last pinned",
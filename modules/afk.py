@@ -12,11 +12,180 @@ import datetime
 import html
 from pyrogram import Client, filters
 from pyrogram.types import Message
-import humanize
 
 from utils.misc import modules_help, prefix
-from utils.scripts import edit_or_reply
-from utils.db import db
+from utils.scripts import edit_or_reply, lazy_import
+from utils.db import db, adb
+from utils.ratelimit import TokenBucket, scheduler
+
+humanize = lazy_import("humanize")
+
+MENTIONS_PER_PAGE = 20
+
+
+class MentionLog:
+    """Append-only log of messages received while AFK
+
+    Every mention is stored under its own sequence-numbered key, so
+    recording one is a single insert. Entries bypass the database cache
+    since they are only read back in pages. Once the log is TRIM_BATCH
+    entries past its limit, the oldest ones are dropped with one ranged
+    delete; until then the extra entries are simply not shown, so it
+    still reads as a fixed-size ring.
+    """
+
+    section = "afk.mentions"
+    TRIM_BATCH = 100
+
+    def __init__(self):
+        newest = next(db.scan(self.section, reverse=True, limit=1), None)
+        oldest = next(db.scan(self.section, limit=1), None)
+        self._next = int(newest[0]) + 1 if newest else 0
+        self._first = int(oldest[0]) if oldest else 0
+        self._migrate_legacy()
+
+    def __len__(self):
+        return min(self._next - self._first, self.limit)
+
+    @property
+    def limit(self) -> int:
+        return db.get("afk", "mentions_limit", 1000)
+
+    @staticmethod
+    def _key(seq: int) -> str:
+        # Zero padded so that keys sort in insertion order
+        return f"{seq:012d}"
+
+    def _migrate_legacy(self):
+        legacy_mentions = db.get("afk", "afk_mentions")
+        if legacy_mentions is None:
+            return
+        with db.transaction():
+            for mention in legacy_mentions:
+                db.set(self.section, self._key(self._next), mention)
+                self._next += 1
+            db.remove("afk", "afk_mentions")
+
+    async def append(self, mention: dict):
+        seq = self._next
+        self._next += 1
+        await adb.aset(self.section, self._key(seq), mention, cache=False)
+        limit = self.limit
+        if self._next - self._first > limit + self.TRIM_BATCH:
+            self._first = self._next - limit
+            await adb.aremove_before(self.section, self._key(self._first))
+
+    async def clear(self):
+        self._first = self._next
+        await adb.aclear(self.section)
+
+    async def page(self, page: int, per_page: int = MENTIONS_PER_PAGE) -> list:
+        """Return one page of mentions, newest first"""
+        offset = (page - 1) * per_page
+        # Entries past the limit are only waiting for the next trim
+        size = min(per_page, len(self) - offset)
+        if size <= 0:
+            return []
+        rows = await adb.ascan(
+            self.section,
+            reverse=True,
+            offset=offset,
+            limit=size
+        )
+        return [mention for _, mention in rows]
+
+
+class AfkState:
+    """AFK status kept in memory
+
+    Loaded once when the module is imported, so the message handlers can
+    tell whether we are AFK without any database access. Commands change
+    the attributes first and then persist them.
+    """
+
+    def __init__(self):
+        settings = db.get_many(
+            "afk", ["afk_status", "afk_time", "afk_reason", "rename_profile", "original_first_name"]
+        )
+        self.active = settings.get("afk_status", False)
+        self.since = settings.get("afk_time", 0)
+        self.reason = settings.get("afk_reason", "No reason specified")
+        self.rename_profile = settings.get("rename_profile", True)
+        self.original_first_name = settings.get("original_first_name")
+
+    async def start(self, reason: str):
+        self.active = True
+        self.since = time.time()
+        self.reason = reason
+        async with adb.transaction():
+            await adb.aset("afk", "afk_status", True)
+            await adb.aset("afk", "afk_reason", reason)
+            await adb.aset("afk", "afk_time", self.since)
+
+    async def stop(self):
+        self.active = False
+        await adb.aset("afk", "afk_status", False)
+
+    async def set_rename_profile(self, enabled: bool):
+        self.rename_profile = enabled
+        await adb.aset("afk", "rename_profile", enabled)
+
+    async def set_original_first_name(self, first_name: str):
+        self.original_first_name = first_name
+        await adb.aset("afk", "original_first_name", first_name)
+
+
+class ReplyLimiter:
+    """Decides whether an AFK notice may be sent
+
+    Every sender gets at most one notice per chat within the dedup window,
+    and each chat has a token bucket on top of that, so a spammy group
+    can't burn the flood budget shared by all handlers.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._replied = {}
+
+    @property
+    def burst(self) -> int:
+        return db.get("afk", "reply_burst", 3)
+
+    @property
+    def per_minute(self) -> float:
+        return db.get("afk", "reply_per_minute", 1)
+
+    @property
+    def window(self) -> int:
+        """Minutes before the same sender gets another notice"""
+        return db.get("afk", "reply_window", 10)
+
+    def allow(self, chat_id: int, user_id: int) -> bool:
+        now = time.monotonic()
+        if self._replied.get((chat_id, user_id), 0) > now:
+            return False
+        
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.burst, self.per_minute / 60)
+        if not bucket.consume():
+            return False
+        
+        if len(self._replied) > 1024:
+            self._replied = {
+                key: expires for key, expires in self._replied.items() if expires > now
+            }
+        self._replied[(chat_id, user_id)] = now + self.window * 60
+        return True
+
+    def reset(self):
+        self._buckets.clear()
+        self._replied.clear()
+
+
+mention_log = MentionLog()
+afk_state = AfkState()
+reply_limiter = ReplyLimiter()
 
 
 @Client.on_message(filters.command("afk", prefix) & filters.me)
@@ -29,19 +198,19 @@ async def afk_cmd(client: Client, message: Message):
         reason = "No reason specified"
     
     # Save AFK info to database
-    db.set("afk", "afk_status", True)
-    db.set("afk", "afk_reason", reason)
-    db.set("afk", "afk_time", time.time())
-    db.set("afk", "afk_mentions", [])
+    await afk_state.start(reason)
+    # Clearing a section is not part of a transaction, so it runs on its own
+    await mention_log.clear()
+    reply_limiter.reset()
     
     # Update user's first name to indicate AFK status
     # Only if setting is enabled
-    if db.get("afk", "rename_profile", True):
+    if afk_state.rename_profile:
         me = await client.get_me()
         try:
             if not me.first_name.startswith("[AFK] "):
                 # Save original name to restore later
-                db.set("afk", "original_first_name", me.first_name)
+                await afk_state.set_original_first_name(me.first_name)
                 await client.update_profile(first_name=f"[AFK] {me.first_name}")
         except Exception as e:
             # Don't let renaming issues stop AFK functionality
@@ -57,20 +226,18 @@ async def afk_cmd(client: Client, message: Message):
 @Client.on_message(filters.incoming & ~filters.bot & filters.private, group=10)
 async def afk_private_handler(client: Client, message: Message):
     """Handle incoming private messages when AFK"""
-    if not db.get("afk", "afk_status", False):
+    if not afk_state.active:
         return
     
     # Get AFK info
-    afk_time = db.get("afk", "afk_time", 0)
-    afk_reason = db.get("afk", "afk_reason", "No reason specified")
+    afk_reason = afk_state.reason
     
     # Calculate time difference
-    time_diff = time.time() - afk_time
+    time_diff = time.time() - afk_state.since
     time_humanized = humanize.naturaltime(datetime.timedelta(seconds=int(time_diff)))
     
     # Store message for later viewing
-    mentions = db.get("afk", "afk_mentions", [])
-    mentions.append({
+    await mention_log.append({
         "user_id": message.from_user.id,
         "username": message.from_user.username,
         "first_name": message.from_user.first_name,
@@ -80,19 +247,21 @@ async def afk_private_handler(client: Client, message: Message):
         "time": time.time()
     })
     
-    # Limit to last 50 mentions
-    if len(mentions) > 50:
-        mentions = mentions[-50:]
-    
-    db.set("afk", "afk_mentions", mentions)
+    if not reply_limiter.allow(message.chat.id, message.from_user.id):
+        return
     
     # Reply to the message
     try:
-        await message.reply(
+        await scheduler.call(
+            "send",
+            message.reply,
             f"<b>⚠️ I'm currently AFK</b>\n"
             f"<b>Last seen:</b> <i>{time_humanized}</i>\n"
             f"<b>Reason:</b> <i>{html.escape(afk_reason)}</i>\n\n"
-            f"<i>I'll respond when I return.</i>"
+            f"<i>I'll respond when I return.</i>",
+            chat=message.chat.id,
+            lane=scheduler.BACKGROUND,
+            retries=0
         )
     except Exception:
         # Don't break on message reply failures
@@ -102,7 +271,7 @@ async def afk_private_handler(client: Client, message: Message):
 @Client.on_message(filters.incoming & ~filters.bot & filters.group, group=10)
 async def afk_group_handler(client: Client, message: Message):
     """Handle mentions in groups when AFK"""
-    if not db.get("afk", "afk_status", False):
+    if not afk_state.active:
         return
     
     # Only process if user is mentioned or message is a reply to the user
@@ -112,16 +281,14 @@ async def afk_group_handler(client: Client, message: Message):
         return
     
     # Get AFK info
-    afk_time = db.get("afk", "afk_time", 0)
-    afk_reason = db.get("afk", "afk_reason", "No reason specified")
+    afk_reason = afk_state.reason
     
     # Calculate time difference
-    time_diff = time.time() - afk_time
+    time_diff = time.time() - afk_state.since
     time_humanized = humanize.naturaltime(datetime.timedelta(seconds=int(time_diff)))
     
     # Store mention for later viewing
-    mentions = db.get("afk", "afk_mentions", [])
-    mentions.append({
+    await mention_log.append({
         "user_id": message.from_user.id,
         "username": message.from_user.username,
         "first_name": message.from_user.first_name,
@@ -132,27 +299,33 @@ async def afk_group_handler(client: Client, message: Message):
         "time": time.time()
     })
     
-    # Limit to last 50 mentions
-    if len(mentions) > 50:
-        mentions = mentions[-50:]
-    
-    db.set("afk", "afk_mentions", mentions)
+    if not reply_limiter.allow(message.chat.id, message.from_user.id):
+        return
     
     # Reply to the message
     try:
-        await message.reply(
+        await scheduler.call(
+            "send",
+            message.reply,
             f"<b>⚠️ I'm currently AFK</b>\n"
             f"<b>Last seen:</b> <i>{time_humanized}</i>\n"
-            f"<b>Reason:</b> <i>{html.escape(afk_reason)}</i>"
+            f"<b>Reason:</b> <i>{html.escape(afk_reason)}</i>",
+            chat=message.chat.id,
+            lane=scheduler.BACKGROUND,
+            retries=0
         )
     except Exception:
         # Don't break on message reply failures
         pass
 
 
-@Client.on_message(filters.me & ~filters.edited, group=11)
+@Client.on_message(filters.me, group=11)
 async def unafk_handler(client: Client, message: Message):
     """Handle the user's return from AFK status"""
+    # Runs for every outgoing message, keep the common case free of I/O
+    if not afk_state.active:
+        return
+    
     # Skip commands
     if message.text and message.text.startswith(prefix):
         return
@@ -161,58 +334,60 @@ async def unafk_handler(client: Client, message: Message):
     if message.text and message.text.split()[0] == f"{prefix}afk":
         return
         
-    if db.get("afk", "afk_status", False):
-        # Calculate AFK time
-        afk_time = db.get("afk", "afk_time", 0)
-        time_diff = time.time() - afk_time
-        time_humanized = humanize.naturaldelta(datetime.timedelta(seconds=int(time_diff)))
-        
-        # Restore original name if changed
-        if db.get("afk", "rename_profile", True):
-            try:
-                me = await client.get_me()
-                if me.first_name.startswith("[AFK] "):
-                    original_name = db.get("afk", "original_first_name", me.first_name[6:])
-                    await client.update_profile(first_name=original_name)
-            except Exception:
-                # Don't let renaming issues stop AFK functionality
-                pass
-        
-        # Get mention count
-        mentions = db.get("afk", "afk_mentions", [])
-        mention_count = len(mentions)
-        
-        # Reset AFK status
-        db.set("afk", "afk_status", False)
-        
-        # Notify about return
+    # Reset AFK status before any await so that we only return once
+    await afk_state.stop()
+    
+    # Calculate AFK time
+    time_diff = time.time() - afk_state.since
+    time_humanized = humanize.naturaldelta(datetime.timedelta(seconds=int(time_diff)))
+    
+    # Restore original name if changed
+    if afk_state.rename_profile:
         try:
-            await client.send_message(
-                "me",
-                f"<b>🌞 Welcome back! You are no longer AFK</b>\n\n"
-                f"<b>Duration:</b> <i>{time_humanized}</i>\n"
-                f"<b>Mentions:</b> <i>{mention_count}</i>\n\n"
-                f"<i>Use <code>{prefix}afklog</code> to see messages received while AFK.</i>"
-            )
+            me = await client.get_me()
+            if me.first_name.startswith("[AFK] "):
+                original_name = afk_state.original_first_name or me.first_name[6:]
+                await client.update_profile(first_name=original_name)
         except Exception:
-            # Don't break on message failures
+            # Don't let renaming issues stop AFK functionality
             pass
+    
+    # Get mention count
+    mention_count = len(mention_log)
+    
+    # Notify about return
+    try:
+        await scheduler.call(
+            "send",
+            client.send_message,
+            "me",
+            f"<b>🌞 Welcome back! You are no longer AFK</b>\n\n"
+            f"<b>Duration:</b> <i>{time_humanized}</i>\n"
+            f"<b>Mentions:</b> <i>{mention_count}</i>\n\n"
+            f"<i>Use <code>{prefix}afklog</code> to see messages received while AFK.</i>",
+            chat="me"
+        )
+    except Exception:
+        # Don't break on message failures
+        pass
 
 
 @Client.on_message(filters.command(["afklog", "afkm", "mentions"], prefix) & filters.me)
 async def afk_log_cmd(client: Client, message: Message):
-    """View messages received while AFK"""
-    mentions = db.get("afk", "afk_mentions", [])
+    """View messages received while AFK, newest first"""
+    page = 1
+    if len(message.command) > 1 and message.command[1].isdigit():
+        page = max(int(message.command[1]), 1)
+    
+    mentions = await mention_log.page(page)
     
     if not mentions:
         await edit_or_reply(message, "<b>📪 No messages received while you were AFK.</b>")
         return
     
-    # Sort mentions by time (newest first)
-    mentions.sort(key=lambda x: x.get("time", 0), reverse=True)
-    
-    output = "<b>📬 Messages received while AFK:</b>\n\n"
-    counter = 0
+    pages = (len(mention_log) + MENTIONS_PER_PAGE - 1) // MENTIONS_PER_PAGE
+    output = f"<b>📬 Messages received while AFK (page {page}/{pages}):</b>\n\n"
+    counter = (page - 1) * MENTIONS_PER_PAGE
     
     for mention in mentions:
         counter += 1
@@ -239,56 +414,105 @@ async def afk_log_cmd(client: Client, message: Message):
         
         # Avoid message too long errors by splitting
         if len(output) > 3500:
-            await client.send_message("me", output)
+            await scheduler.call("send", client.send_message, "me", output, chat="me")
             output = "<b>📬 Messages continued:</b>\n\n"
     
+    if page < pages:
+        output += f"<i>Use <code>{prefix}afklog {page + 1}</code> for older messages.</i>"
+    
     if output:
-        await client.send_message("me", output)
+        await scheduler.call("send", client.send_message, "me", output, chat="me")
     
     # Delete the command if in a group
     if message.chat.type != "private":
-        await message.delete()
-        await client.send_message(
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
+        await scheduler.call(
+            "send",
+            client.send_message,
             message.from_user.id,
-            "<b>✅ AFK log sent to your Saved Messages.</b>"
+            "<b>✅ AFK log sent to your Saved Messages.</b>",
+            chat=message.from_user.id
         )
     else:
-        await message.edit("<b>✅ AFK log sent to your Saved Messages.</b>")
+        await scheduler.call(
+            "edit",
+            message.edit,
+            "<b>✅ AFK log sent to your Saved Messages.</b>",
+            chat=message.chat.id
+        )
         
 
 @Client.on_message(filters.command("afkinfo", prefix) & filters.me)
 async def afk_info_cmd(client: Client, message: Message):
     """Show current AFK settings"""
-    is_afk = db.get("afk", "afk_status", False)
-    rename_profile = db.get("afk", "rename_profile", True)
+    is_afk = afk_state.active
+    rename_profile = afk_state.rename_profile
     
     text = "<b>⚙️ AFK Settings:</b>\n\n"
     text += f"<b>Current status:</b> {'🌙 AFK' if is_afk else '🌞 Not AFK'}\n"
     text += f"<b>Auto rename profile:</b> {'✅ Enabled' if rename_profile else '❌ Disabled'}\n"
     
     if is_afk:
-        afk_time = db.get("afk", "afk_time", 0)
-        afk_reason = db.get("afk", "afk_reason", "No reason specified")
+        afk_reason = afk_state.reason
         
-        time_diff = time.time() - afk_time
+        time_diff = time.time() - afk_state.since
         time_humanized = humanize.naturaldelta(datetime.timedelta(seconds=int(time_diff)))
         
         text += f"\n<b>AFK duration:</b> {time_humanized}\n"
         text += f"<b>AFK reason:</b> {html.escape(afk_reason)}\n"
         
-        mentions = db.get("afk", "afk_mentions", [])
-        text += f"<b>Messages received:</b> {len(mentions)}"
+        text += f"<b>Messages received:</b> {len(mention_log)}"
     
     await edit_or_reply(message, text)
 
 
+@Client.on_message(filters.command("afklimit", prefix) & filters.me)
+async def afk_limit_cmd(client: Client, message: Message):
+    """Show or change how many AFK mentions are kept"""
+    if len(message.command) < 2:
+        await edit_or_reply(message, f"<b>📦 Keeping the last {mention_log.limit} mentions.</b>")
+        return
+    
+    if not message.command[1].isdigit() or int(message.command[1]) < 1:
+        await edit_or_reply(message, "<b>❌ Limit must be a positive number.</b>")
+        return
+    
+    await adb.aset("afk", "mentions_limit", int(message.command[1]))
+    await edit_or_reply(message, f"<b>✅ Keeping the last {mention_log.limit} mentions.</b>")
+
+
+@Client.on_message(filters.command("afkrate", prefix) & filters.me)
+async def afk_rate_cmd(client: Client, message: Message):
+    """Show or change how often AFK notices are sent"""
+    args = message.command[1:]
+    if args:
+        if len(args) != 3 or not all(arg.isdigit() and int(arg) > 0 for arg in args):
+            await edit_or_reply(
+                message,
+                f"<b>❌ Usage:</b> <code>{prefix}afkrate [burst] [per minute] [window minutes]</code>"
+            )
+            return
+        
+        async with adb.transaction():
+            await adb.aset("afk", "reply_burst", int(args[0]))
+            await adb.aset("afk", "reply_per_minute", int(args[1]))
+            await adb.aset("afk", "reply_window", int(args[2]))
+        reply_limiter.reset()
+    
+    await edit_or_reply(
+        message,
+        f"<b>⏱ AFK notices:</b> up to {reply_limiter.burst} at once and "
+        f"{reply_limiter.per_minute} per minute per chat, "
+        f"one per sender every {reply_limiter.window} minutes"
+    )
+
+
 @Client.on_message(filters.command(["toggleafkrename", "afkr"], prefix) & filters.me)
 async def toggle_afk_rename_cmd(client: Client, message: Message):
     """Toggle automatic profile renaming during AFK"""
-    current_setting = db.get("afk", "rename_profile", True)
-    new_setting = not current_setting
+    new_setting = not afk_state.rename_profile
     
-    db.set("afk", "rename_profile", new_setting)
+    await afk_state.set_rename_profile(new_setting)
     
     if new_setting:
         await edit_or_reply(message, "<b>✅ Auto rename profile during AFK enabled.</b>")
@@ -298,10 +522,12 @@ async def toggle_afk_rename_cmd(client: Client, message: Message):
 
 modules_help["afk"] = {
     "afk [reason]": "Set your status as AFK",
-    "afklog": "View messages received while AFK",
+    "afklog [page]": "View messages received while AFK",
     "afkm": "Alias for afklog command",
     "mentions": "Alias for afklog command",
     "afkinfo": "Show current AFK settings",
+    "afklimit [count]": "Show or set how many AFK mentions are kept",
+    "afkrate [burst] [per minute] [window]": "Show or set how often AFK notices are sent",
     "toggleafkrename": "Toggle automatic profile renaming during AFK",
     "afkr": "Alias for toggleafkrename command",
     "__category__": "utils"
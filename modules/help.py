@@ -12,6 +12,7 @@ from pyrogram.types import Message
 
 from utils.misc import modules_help, prefix
 from utils.scripts import edit_or_reply
+from utils.ratelimit import scheduler
 
 
 @Client.on_message(filters.command(["help", "h"], prefix) & filters.me)
@@ -50,7 +51,7 @@ async def help_cmd(client: Client, message: Message):
     else:
         await edit_or_reply(message, f"<b>Module {message.command[1]} not found!</b>")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
 
 
 @Client.on_message(filters.command("modules", prefix) & filters.me)
@@ -21,11 +21,14 @@ from pyrogram import Client, filters
 from pyrogram.types import Message
 
 from utils.misc import modules_help, prefix, python_version, userbot_version, gitrepo
+from utils.ratelimit import scheduler
 
 
 @Client.on_message(filters.command(["about", "info"], prefix) & filters.me)
 async def about(client: Client, message: Message):
-    await message.edit(
+    await scheduler.call(
+        "edit",
+        message.edit,
         f"<b>CybroX-UserBot</b>\n\n"
         f"<b>• Version:</b> <code>{userbot_version}</code>\n"
         f"<b>• Python:</b> <code>{python_version}</code>\n"
@@ -33,7 +36,8 @@ async def about(client: Client, message: Message):
         f"<b>• Platform:</b> <code>{sys.platform}</code>\n"
         f"<b>• System:</b> <code>{platform.version()}</code>\n\n"
         f"<b>• Repository:</b> <a href='https://github.com/YourUsername/CybroX-UserBot'>GitHub</a>\n"
-        f"<b>• Channel:</b> <a href='https://t.me/YourChannel'>Telegram</a>"
+        f"<b>• Channel:</b> <a href='https://t.me/YourChannel'>Telegram</a>",
+        chat=message.chat.id
     )
 
 
@@ -42,21 +46,32 @@ async def help_command(client: Client, message: Message):
     if len(message.command) > 1:
         module_name = message.command[1].lower()
         if module_name in modules_help:
-            await message.edit(
+            await scheduler.call(
+                "edit",
+                message.edit,
                 f"<b>Help for {module_name} module:</b>\n\n"
                 + "\n".join(
                     f"<code>{prefix}{command}</code>: {description}"
                     for command, description in modules_help[module_name].items()
-                )
+                ),
+                chat=message.chat.id
             )
         else:
-            await message.edit(f"<b>Module {module_name} not found!</b>")
+            await scheduler.call(
+                "edit",
+                message.edit,
+                f"<b>Module {module_name} not found!</b>",
+                chat=message.chat.id
+            )
     else:
-        await message.edit(
+        await scheduler.call(
+            "edit",
+            message.edit,
             f"<b>CybroX UserBot Help</b>\n\n"
             f"<b>Available Modules:</b>\n"
             + "\n".join(f"• <code>{module}</code>" for module in sorted(modules_help.keys()))
-            + f"\n\nUse <code>{prefix}help [module]</code> to get help for a specific module."
+            + f"\n\nUse <code>{prefix}help [module]</code> to get help for a specific module.",
+            chat=message.chat.id
         )
 
 
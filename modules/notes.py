@@ -12,7 +12,26 @@ from pyrogram.types import Message
 
 from utils.misc import modules_help, prefix
 from utils.scripts import edit_or_reply, with_reply
-from utils.db import db
+from utils.db import db, adb
+from utils.ratelimit import scheduler
+
+# One key per note, so a lookup never loads the other notes
+NOTES_SECTION = "notes.items"
+NOTES_PER_PAGE = 50
+
+
+def migrate_legacy_notes():
+    """Split the old single-blob notes dict into one key per note"""
+    legacy_notes = db.get("notes", "notes")
+    if not legacy_notes:
+        return
+    with db.transaction():
+        for name, note in legacy_notes.items():
+            db.set(NOTES_SECTION, name, note)
+        db.remove("notes", "notes")
+
+
+migrate_legacy_notes()
 
 
 @Client.on_message(filters.command("save", prefix) & filters.me)
@@ -21,7 +40,7 @@ async def save_note(client: Client, message: Message):
     if len(message.command) < 2:
         await edit_or_reply(message, "<b>Not enough arguments!</b>\nUsage: .save [name] [content or reply]")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
     note_name = message.command[1].lower()
@@ -57,7 +76,7 @@ async def save_note(client: Client, message: Message):
         else:
             await edit_or_reply(message, "<b>Unsupported message type!</b>")
             await asyncio.sleep(3)
-            await message.delete()
+            await scheduler.call("delete", message.delete, chat=message.chat.id)
             return
             
         # Save additional caption if provided
@@ -70,7 +89,7 @@ async def save_note(client: Client, message: Message):
         if len(message.command) < 3:
             await edit_or_reply(message, "<b>Not enough arguments!</b>\nUsage: .save [name] [content]")
             await asyncio.sleep(3)
-            await message.delete()
+            await scheduler.call("delete", message.delete, chat=message.chat.id)
             return
             
         note_content = " ".join(message.command[2:])
@@ -78,17 +97,15 @@ async def save_note(client: Client, message: Message):
         note_caption = ""
     
     # Save note to database
-    notes = db.get("notes", "notes", {})
-    notes[note_name] = {
+    await adb.aset(NOTES_SECTION, note_name, {
         "type": note_type,
         "content": note_content,
         "caption": note_caption
-    }
-    db.set("notes", "notes", notes)
+    })
     
     await edit_or_reply(message, f"<b>Note '{note_name}' saved successfully!</b>")
     await asyncio.sleep(2)
-    await message.delete()
+    await scheduler.call("delete", message.delete, chat=message.chat.id)
 
 
 @Client.on_message(filters.command("get", prefix) & filters.me)
@@ -97,84 +114,128 @@ async def get_note(client: Client, message: Message):
     if len(message.command) < 2:
         await edit_or_reply(message, "<b>Not enough arguments!</b>\nUsage: .get [name]")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
     note_name = message.command[1].lower()
-    notes = db.get("notes", "notes", {})
+    note = await adb.aget(NOTES_SECTION, note_name)
     
-    if note_name not in notes:
+    if note is None:
         await edit_or_reply(message, f"<b>Note '{note_name}' not found!</b>")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
-    note = notes[note_name]
-    await message.delete()
+    await scheduler.call("delete", message.delete, chat=message.chat.id)
     
     if note["type"] == "text":
-        await client.send_message(
+        await scheduler.call(
+            "send",
+            client.send_message,
             message.chat.id,
             note["content"],
-            disable_web_page_preview=True
+            disable_web_page_preview=True,
+            chat=message.chat.id
         )
     elif note["type"] == "caption":
-        await client.send_message(
+        await scheduler.call(
+            "send",
+            client.send_message,
             message.chat.id,
             note["content"],
-            disable_web_page_preview=True
+            disable_web_page_preview=True,
+            chat=message.chat.id
         )
     elif note["type"] == "photo":
-        await client.send_photo(
+        await scheduler.call(
+            "send",
+            client.send_photo,
             message.chat.id,
             note["content"],
-            caption=note["caption"]
+            caption=note["caption"],
+            chat=message.chat.id
         )
     elif note["type"] == "document":
-        await client.send_document(
+        await scheduler.call(
+            "send",
+            client.send_document,
             message.chat.id,
             note["content"],
-            caption=note["caption"]
+            caption=note["caption"],
+            chat=message.chat.id
         )
     elif note["type"] == "video":
-        await client.send_video(
+        await scheduler.call(
+            "send",
+            client.send_video,
             message.chat.id,
             note["content"],
-            caption=note["caption"]
+            caption=note["caption"],
+            chat=message.chat.id
         )
     elif note["type"] == "audio":
-        await client.send_audio(
+        await scheduler.call(
+            "send",
+            client.send_audio,
             message.chat.id,
             note["content"],
-            caption=note["caption"]
+            caption=note["caption"],
+            chat=message.chat.id
         )
     elif note["type"] == "voice":
-        await client.send_voice(
+        await scheduler.call(
+            "send",
+            client.send_voice,
             message.chat.id,
             note["content"],
-            caption=note["caption"]
+            caption=note["caption"],
+            chat=message.chat.id
         )
     elif note["type"] == "sticker":
-        await client.send_sticker(
+        await scheduler.call(
+            "send",
+            client.send_sticker,
             message.chat.id,
-            note["content"]
+            note["content"],
+            chat=message.chat.id
         )
 
 
 @Client.on_message(filters.command("notes", prefix) & filters.me)
 async def list_notes(client: Client, message: Message):
-    """List all saved notes"""
-    notes = db.get("notes", "notes", {})
+    """List saved notes, optionally filtered by a search term"""
+    args = message.command[1:]
+    page = 1
+    if args and args[-1].isdigit():
+        page = max(int(args.pop()), 1)
+    query = args[0].lower() if args else None
+    # "name*" searches by prefix, anything else by substring
+    if query and query.endswith("*"):
+        search = {"prefix": query[:-1] or None}
+    else:
+        search = {"contains": query}
     
-    if not notes:
+    total = await adb.acount(NOTES_SECTION, **search)
+    if not total:
         await edit_or_reply(message, "<b>No notes found!</b>")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
+    pages = (total + NOTES_PER_PAGE - 1) // NOTES_PER_PAGE
+    page = min(page, pages)
+    notes = await adb.ascan(
+        NOTES_SECTION,
+        **search,
+        offset=(page - 1) * NOTES_PER_PAGE,
+        limit=NOTES_PER_PAGE
+    )
+    
     text = "<b>Saved notes:</b>\n"
-    for name in sorted(notes.keys()):
-        text += f"• <code>{name}</code>: {notes[name]['type']}\n"
+    for name, note in notes:
+        text += f"• <code>{name}</code>: {note['type']}\n"
+    if pages > 1:
+        text += f"\n<b>Page {page}/{pages}</b> ({total} notes)"
     
     await edit_or_reply(message, text)
 
@@ -185,30 +246,28 @@ async def clear_note(client: Client, message: Message):
     if len(message.command) < 2:
         await edit_or_reply(message, "<b>Not enough arguments!</b>\nUsage: .clear [name]")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
     note_name = message.command[1].lower()
-    notes = db.get("notes", "notes", {})
     
-    if note_name not in notes:
+    if await adb.aget(NOTES_SECTION, note_name) is None:
         await edit_or_reply(message, f"<b>Note '{note_name}' not found!</b>")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
-    del notes[note_name]
-    db.set("notes", "notes", notes)
+    await adb.aremove(NOTES_SECTION, note_name)
     
     await edit_or_reply(message, f"<b>Note '{note_name}' deleted successfully!</b>")
     await asyncio.sleep(2)
-    await message.delete()
+    await scheduler.call("delete", message.delete, chat=message.chat.id)
 
 
 modules_help["notes"] = {
     "save [name] [text]": "Save a note with the given name and content (or reply to a message)",
     "get [name]": "Retrieve a saved note",
-    "notes": "List all saved notes",
+    "notes [query] [page]": "List saved notes, optionally filtered by name (use name* for a prefix)",
     "clear [name]": "Delete a saved note",
     "__category__": "utils"
 }
\ No newline at end of file
@@ -14,6 +14,7 @@ from pyrogram.types import Message
 
 from utils.misc import modules_help, prefix
 from utils.scripts import edit_or_reply
+from utils.ratelimit import scheduler
 
 
 @Client.on_message(filters.command(["ping", "p"], prefix) & filters.me)
@@ -23,7 +24,9 @@ async def ping_command(client: Client, message: Message):
     msg = await edit_or_reply(message, "<b>Pinging...</b>")
     end = datetime.now()
     ms = (end - start).microseconds / 1000
-    await msg.edit(f"<b>🏓 Pong!</b>\n<code>{ms:.2f}ms</code>")
+    await scheduler.call(
+        "edit", msg.edit, f"<b>🏓 Pong!</b>\n<code>{ms:.2f}ms</code>", chat=msg.chat.id
+    )
 
 
 @Client.on_message(filters.command("alive", prefix) & filters.me)
@@ -31,11 +34,14 @@ async def alive_command(client: Client, message: Message):
     """Show that the bot is running"""
     from utils.misc import userbot_version
     
-    await message.edit(
+    await scheduler.call(
+        "edit",
+        message.edit,
         f"<b>🔥 CybroX-UserBot is alive!</b>\n\n"
         f"<b>Version:</b> <code>{userbot_version}</code>\n"
         f"<b>Pyrogram:</b> <code>{'.'.join(str(x) for x in client.pyrogram_version)}</code>\n"
-        f"<b>Prefix:</b> <code>{prefix}</code>"
+        f"<b>Prefix:</b> <code>{prefix}</code>",
+        chat=message.chat.id
     )
 
 
@@ -8,66 +8,212 @@
 
 import asyncio
 import time
+from typing import Optional
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from pyrogram.errors import MessageDeleteForbidden, FloodWait
+from pyrogram.errors import MessageDeleteForbidden, FloodWait, RPCError
 
 from utils.misc import modules_help, prefix
-from utils.scripts import edit_or_reply, with_reply
+from utils.scripts import edit_or_reply
+from utils.ratelimit import scheduler
+from utils.autodelete import delete_scheduler
+
+
+class PurgeEngine:
+    """Deletes messages in chunks of 100 with several requests in flight
+
+    The number of chunks in flight is halved on every FloodWait and grows
+    back by one after a run of successful deletes, so the pace follows
+    what Telegram accepts instead of a fixed sleep. Every chunk goes
+    through the request scheduler's delete and per-chat buckets, but with
+    retries=0: the engine has to see each FloodWait itself to shrink the
+    window, so it counts the retries. A chunk gives up after the
+    scheduler's retry limit, or at once if the wait is longer than its
+    max_wait. The engine then stops and keeps the wait; any other API
+    error stops it as well and is kept in error.
+    """
+
+    CHUNK_SIZE = 100
+    STATUS_INTERVAL = 3
+
+    def __init__(self, client: Client, chat_id: int, status: Message = None, max_in_flight: int = 8):
+        self.client = client
+        self.chat_id = chat_id
+        self.status = status
+        self.max_in_flight = max_in_flight
+        self.deleted = 0
+        self.forbidden = False
+        self.flood_wait = None
+        self.error = None
+        self._limit = min(3, max_in_flight)
+        self._in_flight = 0
+        self._successes = 0
+        self._buffer = []
+        self._tasks = set()
+        self._slots = asyncio.Condition()
+        self._last_status = time.monotonic()
+
+    @property
+    def stopped(self) -> bool:
+        return self.forbidden or self.flood_wait is not None or self.error is not None
+
+    def failure(self) -> Optional[str]:
+        """Why the engine stopped early, None if it deleted everything"""
+        if self.forbidden:
+            return f"Cannot delete all messages ({self.deleted} deleted). Try as admin."
+        if self.flood_wait is not None:
+            return f"Stopped by a {int(self.flood_wait)}s flood wait ({self.deleted} deleted)."
+        if self.error is not None:
+            return f"Stopped by an error: {self.error} ({self.deleted} deleted)."
+        return None
+
+    async def add(self, message_id: int):
+        self._buffer.append(message_id)
+        if len(self._buffer) >= self.CHUNK_SIZE:
+            chunk, self._buffer = self._buffer, []
+            await self._submit(chunk)
+
+    async def finish(self) -> int:
+        """Delete what is still buffered, wait for all chunks and return the count"""
+        if self._buffer and not self.stopped:
+            chunk, self._buffer = self._buffer, []
+            await self._submit(chunk)
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        return self.deleted
+
+    async def _submit(self, chunk: list):
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._in_flight < self._limit)
+            self._in_flight += 1
+        # Kept until finish() so that it sees every task's outcome
+        self._tasks.add(asyncio.create_task(self._delete(chunk)))
+
+    async def _delete(self, chunk: list):
+        attempt = 0
+        try:
+            while not self.stopped:
+                wait = scheduler.blocked_for("delete")
+                if wait > scheduler.max_wait:
+                    self.flood_wait = wait
+                    break
+                try:
+                    count = await scheduler.call(
+                        "delete",
+                        self.client.delete_messages,
+                        self.chat_id,
+                        chunk,
+                        chat=self.chat_id,
+                        retries=0
+                    )
+                except FloodWait as e:
+                    self._limit = max(1, self._limit // 2)
+                    self._successes = 0
+                    attempt += 1
+                    if attempt > scheduler.retries or e.value > scheduler.max_wait:
+                        self.flood_wait = e.value
+                        break
+                    continue
+                except MessageDeleteForbidden:
+                    self.forbidden = True
+                    break
+                except RPCError as e:
+                    self.error = e
+                    break
+                self.deleted += count
+                self._successes += 1
+                if self._successes >= 4 and self._limit < self.max_in_flight:
+                    self._limit += 1
+                    self._successes = 0
+                break
+        finally:
+            async with self._slots:
+                self._in_flight -= 1
+                self._slots.notify_all()
+        await self._report()
+
+    async def _report(self):
+        if self.status is None or time.monotonic() - self._last_status < self.STATUS_INTERVAL:
+            return
+        self._last_status = time.monotonic()
+        try:
+            await scheduler.call(
+                "edit",
+                self.status.edit,
+                f"<b>🧹 Purging messages... {self.deleted} deleted</b>",
+                chat=self.chat_id,
+                lane=scheduler.BACKGROUND,
+                retries=0
+            )
+        except Exception:
+            # Progress is best effort
+            pass
 
 
 @Client.on_message(filters.command("purge", prefix) & filters.me)
-@with_reply
-async def purge_cmd(client: Client, message: Message, replied: Message):
+async def purge_cmd(client: Client, message: Message):
     """Delete all messages between replied and current"""
-    msg = await edit_or_reply(message, "<b>🧹 Purging messages...</b>")
+    replied = message.reply_to_message
+    if not replied:
+        await edit_or_reply(message, "<b>❌ Reply to the first message to purge.</b>")
+        await asyncio.sleep(3)
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
+        return
     
-    message_ids = []
+    exact = len(message.command) > 1 and message.command[1].lower() == "exact"
+    msg = await edit_or_reply(message, "<b>🧹 Purging messages...</b>")
     chat_id = message.chat.id
     
-    # Get all message IDs to delete
-    for message_id in range(replied.id, message.id + 1):
-        message_ids.append(message_id)
-        
-        # Delete in chunks of 100 to avoid hitting limits
-        if len(message_ids) == 100:
-            try:
-                await client.delete_messages(chat_id, message_ids)
-            except FloodWait as e:
-                await asyncio.sleep(e.value)
-                await client.delete_messages(chat_id, message_ids)
-            except MessageDeleteForbidden:
-                await msg.edit("<b>❌ Cannot delete all messages. Try as admin.</b>")
-                return
-            message_ids = []
-            await asyncio.sleep(0.5)  # Prevent flood
-    
-    # Delete any remaining messages
-    if message_ids:
-        try:
-            await client.delete_messages(chat_id, message_ids)
-        except FloodWait as e:
-            await asyncio.sleep(e.value)
-            await client.delete_messages(chat_id, message_ids)
-        except MessageDeleteForbidden:
-            pass
+    # The command message shows progress, so it is deleted last
+    engine = PurgeEngine(client, chat_id, status=msg)
+    if exact:
+        # Walk the history so that only ids that exist in this chat (and
+        # topic) are sent, instead of every integer in a sparse range
+        thread_id = None
+        if getattr(message, "is_topic_message", False):
+            thread_id = message.message_thread_id
+        async for history_msg in client.get_chat_history(chat_id, offset_id=message.id):
+            if history_msg.id < replied.id or engine.stopped:
+                break
+            if thread_id and getattr(history_msg, "message_thread_id", None) != thread_id:
+                continue
+            await engine.add(history_msg.id)
+    else:
+        for message_id in range(replied.id, message.id):
+            if engine.stopped:
+                break
+            await engine.add(message_id)
+    count = await engine.finish()
+    
+    failure = engine.failure()
+    if failure:
+        await scheduler.call("edit", msg.edit, f"<b>❌ {failure}</b>", chat=msg.chat.id)
+        return
+    
+    await scheduler.call("delete", msg.delete, chat=msg.chat.id)
+    count += 1
     
     # Send success message
-    count = message.id - replied.id + 1
-    await client.send_message(
+    await scheduler.call(
+        "send",
+        client.send_message,
         chat_id,
         f"<b>🧹 Purged {count} messages!</b>", 
-        disable_notification=True
+        disable_notification=True,
+        chat=chat_id
     )
     
     # Delete success message after 5 seconds
-    msg_info = await client.send_message(
+    msg_info = await scheduler.call(
+        "send",
+        client.send_message,
         chat_id,
         f"<b>✅ Success message will be deleted in 5 seconds.</b>",
-        disable_notification=True
+        disable_notification=True,
+        chat=chat_id
     )
     await asyncio.sleep(5)
-    await client.delete_messages(chat_id, msg_info.id)
+    await scheduler.call("delete", client.delete_messages, chat_id, msg_info.id, chat=chat_id)
 
 
 @Client.on_message(filters.command("del", prefix) & filters.me)
@@ -76,16 +222,16 @@ async def del_cmd(client: Client, message: Message):
     replied = message.reply_to_message
     
     if not replied:
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
         
     try:
-        await replied.delete()
-        await message.delete()
+        await scheduler.call("delete", replied.delete, chat=replied.chat.id)
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
     except MessageDeleteForbidden:
         await edit_or_reply(message, "<b>❌ I don't have permission to delete this message.</b>")
         await asyncio.sleep(2)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
 
 
 @Client.on_message(filters.command("sd", prefix) & filters.me)
@@ -94,7 +240,7 @@ async def selfdestruct_cmd(client: Client, message: Message):
     if len(message.command) < 3:
         await edit_or_reply(message, "<b>❌ Usage: </b><code>.sd [seconds] [text]</code>")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
     # Get seconds and text
@@ -105,39 +251,41 @@ async def selfdestruct_cmd(client: Client, message: Message):
     except ValueError:
         await edit_or_reply(message, "<b>❌ Time must be between 1 second and 24 hours.</b>")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
     text = message.text.split(None, 2)[2]
     
     # Delete the command message
-    await message.delete()
+    await scheduler.call("delete", message.delete, chat=message.chat.id)
     
     # Send the self-destructing message
-    msg = await client.send_message(
+    msg = await scheduler.call(
+        "send",
+        client.send_message,
         message.chat.id,
-        f"{text}\n\n<b>⏳ Self-destructing in {seconds} seconds</b>"
+        f"{text}\n\n<b>⏳ Self-destructing in {seconds} seconds</b>",
+        chat=message.chat.id
     )
     
-    # Sleep and delete
-    await asyncio.sleep(seconds)
-    try:
-        await msg.delete()
-    except:
-        pass
+    # Deleted by the shared scheduler, which also survives restarts
+    await delete_scheduler.schedule(message.chat.id, msg.id, seconds)
 
 
 @Client.on_message(filters.command("clear", prefix) & filters.me)
 async def clear_cmd(client: Client, message: Message):
     """Clear the chat by sending 100 blank lines"""
-    await message.delete()
+    await scheduler.call("delete", message.delete, chat=message.chat.id)
     
     # Send message with 100 newlines
     clear_text = "\n" * 100 + "<b>Chat cleared! 🧹</b>"
     
-    await client.send_message(
+    await scheduler.call(
+        "send",
+        client.send_message,
         message.chat.id,
-        clear_text
+        clear_text,
+        chat=message.chat.id
     )
 
 
@@ -147,67 +295,57 @@ async def purgeme_cmd(client: Client, message: Message):
     if len(message.command) <= 1:
         await edit_or_reply(message, "<b>❌ Usage: </b><code>.purgeme [count]</code>")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
     try:
         count = int(message.command[1])
-        if count < 1 or count > 1000:
+        if count < 1:
             raise ValueError("Invalid count")
     except ValueError:
-        await edit_or_reply(message, "<b>❌ Count must be between 1 and 1000.</b>")
+        await edit_or_reply(message, "<b>❌ Count must be a positive number.</b>")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
-    await message.delete()
+    await scheduler.call("delete", message.delete, chat=message.chat.id)
     
-    # Get your own messages
+    # Let Telegram filter our own messages instead of walking the whole
+    # history. search_messages pages with a growing add_offset, so deleting
+    # while it is still paging would shift later pages past messages we
+    # want; collect every id before the first delete
     message_ids = []
-    total_count = 0
-    
-    async for msg in client.get_chat_history(message.chat.id, limit=1000):
-        if msg.from_user and msg.from_user.is_self:
-            message_ids.append(msg.id)
-            total_count += 1
-            
-            if total_count >= count:
-                break
-            
-            # Delete in chunks of 100 to avoid hitting limits
-            if len(message_ids) == 100:
-                try:
-                    await client.delete_messages(message.chat.id, message_ids)
-                except FloodWait as e:
-                    await asyncio.sleep(e.value)
-                    await client.delete_messages(message.chat.id, message_ids)
-                except MessageDeleteForbidden:
-                    pass
-                message_ids = []
-                await asyncio.sleep(0.5)  # Prevent flood
+    async for msg in client.search_messages(message.chat.id, from_user="me", limit=count + 1):
+        # The search index may still list the command we just deleted
+        if msg.id == message.id:
+            continue
+        message_ids.append(msg.id)
+        if len(message_ids) >= count:
+            break
     
-    # Delete any remaining messages
-    if message_ids:
-        try:
-            await client.delete_messages(message.chat.id, message_ids)
-        except FloodWait as e:
-            await asyncio.sleep(e.value)
-            await client.delete_messages(message.chat.id, message_ids)
-        except MessageDeleteForbidden:
-            pass
+    engine = PurgeEngine(client, message.chat.id)
+    for message_id in message_ids:
+        if engine.stopped:
+            break
+        await engine.add(message_id)
+    total_count = await engine.finish()
     
-    # Send success message and delete it after 3 seconds
-    msg = await client.send_message(
+    # Send the result and delete it after 3 seconds
+    failure = engine.failure()
+    msg = await scheduler.call(
+        "send",
+        client.send_message,
         message.chat.id,
-        f"<b>🧹 Purged {total_count} of your messages!</b>",
-        disable_notification=True
+        f"<b>❌ {failure}</b>" if failure else f"<b>🧹 Purged {total_count} of your messages!</b>",
+        disable_notification=True,
+        chat=message.chat.id
     )
     await asyncio.sleep(3)
-    await msg.delete()
+    await scheduler.call("delete", msg.delete, chat=msg.chat.id)
 
 
 modules_help["purge"] = {
-    "purge": "Delete all messages from replied to current",
+    "purge [exact]": "Delete all messages from replied to current (exact: only look up and delete messages that exist, for sparse supergroups and topics)",
     "del": "Delete replied message",
     "sd [seconds] [text]": "Send self-destructing message",
     "clear": "Clear the chat with blank lines",
@@ -8,62 +8,137 @@
 
 import io
 import os
-import math
 import asyncio
-import random
-from typing import Optional, Tuple, Union
-from PIL import Image
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Union
 
 from pyrogram import Client, filters, errors
-from pyrogram.types import Message, StickerSet
+from pyrogram.types import Message
 from pyrogram.raw.functions.messages import GetStickerSet
 from pyrogram.raw.types import InputStickerSetShortName
 
 from utils.misc import modules_help, prefix
 from utils.scripts import edit_or_reply, with_reply
-from utils.db import db
+from utils.db import adb
+from utils.ratelimit import scheduler
+from utils.imaging import resize_image_sync
 
+# Pillow work is CPU bound and mostly holds the GIL, so it runs in worker
+# processes, which only need to import utils.imaging; at most IMAGE_QUEUE
+# images are being processed or waiting
+IMAGE_WORKERS = min(4, os.cpu_count() or 1)
+IMAGE_QUEUE = IMAGE_WORKERS * 2
+_image_pool = None
+_image_slots = asyncio.Semaphore(IMAGE_QUEUE)
+# Sources up to this size are downloaded into memory, larger ones go
+# through a temporary file that the worker process reads directly
+MEMORY_DOWNLOAD_LIMIT = 10 * 1024 * 1024
 
-async def resize_image(image: bytes, is_sticker: bool = False) -> bytes:
-    """Resize image to sticker-friendly size"""
-    image = Image.open(io.BytesIO(image))
-    
-    # Handle RGBA vs RGB
-    if image.mode == "RGBA":
-        mode = "RGBA"
-    else:
-        mode = "RGB"
-        image = image.convert("RGB")
-    
-    # Calculate dimensions
-    size = 512
-    width, height = image.size
-    
-    # Preserve aspect ratio within Telegram's requirements
-    if width > height:
-        new_width = size
-        new_height = int(height * (size / width))
-    else:
-        new_height = size
-        new_width = int(width * (size / height))
-        
-    image = image.resize((new_width, new_height))
-    
-    # Create centered image
-    new_image = Image.new(mode, (size, size), (0, 0, 0, 0))
-    x_offset = (size - new_width) // 2
-    y_offset = (size - new_height) // 2
-    new_image.paste(image, (x_offset, y_offset), image if mode == "RGBA" else None)
-    
-    # Convert to bytes
-    output = io.BytesIO()
-    if is_sticker:
-        new_image.save(output, format="WEBP")
+MAX_STICKERS = 120
+# Current pack of each kind keyed by its base name: {"index": n, "count": c}
+PACKS_SECTION = "stickers.packs"
+# Upload errors that mean the stored pack is gone, full or taken
+STALE_PACK_ERRORS = {
+    "STICKERSET_INVALID",
+    "STICKERS_TOO_MUCH",
+    "STICKERPACK_STICKERS_TOO_MUCH",
+    "SHORTNAME_OCCUPY_FAILED",
+    "SHORT_NAME_OCCUPIED",
+}
+
+
+def get_image_pool() -> Optional[ProcessPoolExecutor]:
+    """Start the image worker processes on first use"""
+    global _image_pool
+    if _image_pool is None:
+        try:
+            _image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        except (OSError, NotImplementedError):
+            # No multiprocessing support here, threads are better than the loop
+            return None
+    return _image_pool
+
+
+async def resize_image(image: Union[bytes, str], is_sticker: bool = False) -> bytes:
+    """Resize image to sticker-friendly size without blocking the event loop"""
+    global _image_pool
+    async with _image_slots:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                get_image_pool(), resize_image_sync, image, is_sticker
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory), start fresh next time
+            _image_pool = None
+            raise
+
+
+def indexed_pack(base: str, index: int, separator: str = "_") -> str:
+    """Name or title of the index-th pack of a kind, the first has no number"""
+    return f"{base}{separator}{index}" if index else base
+
+
+async def find_pack(client: Client, base_name: str) -> dict:
+    """Look up the first pack of a kind that is not full"""
+    index = 0
+    while True:
+        try:
+            sticker_set = await client.invoke(
+                GetStickerSet(
+                    stickerset=InputStickerSetShortName(short_name=indexed_pack(base_name, index)),
+                    hash=0
+                )
+            )
+        except errors.StickersetInvalid:
+            return {"index": index, "count": 0}
+        if sticker_set.set.count < MAX_STICKERS:
+            return {"index": index, "count": sticker_set.set.count}
+        index += 1
+
+
+async def get_pack_state(client: Client, base_name: str) -> dict:
+    """Current pack of a kind from the registry, looked up only the first time"""
+    pack = await adb.aget(PACKS_SECTION, base_name)
+    if pack is None:
+        pack = await find_pack(client, base_name)
+        await adb.aset(PACKS_SECTION, base_name, pack)
+    return pack
+
+
+async def upload_sticker(
+    client: Client,
+    user_id: int,
+    base_name: str,
+    base_title: str,
+    pack: dict,
+    file,
+    emoji: str
+):
+    """Add the sticker to the pack, creating the pack if it is empty
+
+    Static, animated and video stickers go through the same methods, the
+    kind is taken from file: the file_id of an existing sticker, which is
+    reused without any upload, or a new file.
+    """
+    name = indexed_pack(base_name, pack["index"])
+    if pack["count"] == 0:
+        await client.create_sticker_set(
+            title=indexed_pack(base_title, pack["index"], " "),
+            short_name=name,
+            sticker=file,
+            user_id=user_id,
+            emoji=emoji
+        )
     else:
-        new_image.save(output, format="PNG")
-    output.seek(0)
-    
-    return output.getvalue()
+        await client.add_sticker_to_set(
+            set_short_name=name,
+            sticker=file,
+            user_id=user_id,
+            emoji=emoji
+        )
 
 
 @Client.on_message(filters.command("kang", prefix) & filters.me)
@@ -74,21 +149,26 @@ async def kang_cmd(client: Client, message: Message):
     # Check for necessary elements (replied message or attachment)
     replied = message.reply_to_message
     if not replied:
-        await msg.edit("<b>❌ Reply to a sticker or image to kang it!</b>")
+        await scheduler.call(
+            "edit", msg.edit, "<b>❌ Reply to a sticker or image to kang it!</b>", chat=msg.chat.id
+        )
         await asyncio.sleep(3)
-        await msg.delete()
+        await scheduler.call("delete", msg.delete, chat=msg.chat.id)
         return
     
     # Get sticker pack details from user's settings or defaults
-    user = await client.get_me()
-    pack_prefix = db.get("stickers", "pack_prefix", "CybroX_")
-    max_stickers = 120
+    user = client.me or await client.get_me()
+    pack_prefix = await adb.aget("stickers", "pack_prefix", "CybroX_")
+    
+    # Only set for sources too large to keep in memory
+    temp_path = None
     
     # Process media based on type
     try:
         if replied.sticker:
-            # Handle sticker
-            file_id = replied.sticker.file_id
+            # Handle sticker; it is already on Telegram's servers, so it is
+            # added by file_id instead of being downloaded and uploaded again
+            file = replied.sticker.file_id
             emoji = replied.sticker.emoji if replied.sticker.emoji else "🤔"
             is_animated = replied.sticker.is_animated
             is_video = replied.sticker.is_video
@@ -106,10 +186,6 @@ async def kang_cmd(client: Client, message: Message):
             
             pack_name = f"{pack_prefix}{user.id}{pack_suffix}"
             
-            # Download the sticker file
-            await msg.edit("<b>🔄 Downloading sticker...</b>")
-            file = await client.download_media(replied, in_memory=False)
-            
         elif replied.photo or (replied.document and "image" in replied.document.mime_type):
             # Handle image
             emoji = "🤔"  # Default emoji
@@ -122,179 +198,76 @@ async def kang_cmd(client: Client, message: Message):
                 emoji = message.command[1]
             
             # Download and resize the image
-            await msg.edit("<b>🔄 Downloading and processing image...</b>")
-            file = await client.download_media(replied, in_memory=False)
-            
-            with open(file, "rb") as f:
-                image_data = f.read()
-            
-            image_data = await resize_image(image_data, True)
+            await scheduler.call(
+                "edit", msg.edit, "<b>🔄 Downloading and processing image...</b>", chat=msg.chat.id
+            )
+            media = replied.photo or replied.document
+            if media.file_size and media.file_size > MEMORY_DOWNLOAD_LIMIT:
+                # A unique file, concurrent kangs of one message must not share it
+                fd, temp_path = tempfile.mkstemp(prefix="kang_")
+                os.close(fd)
+                source = await client.download_media(replied, file_name=temp_path)
+            else:
+                source = (await client.download_media(replied, in_memory=True)).getvalue()
             
-            # Save the resized image
-            with open(file, "wb") as f:
-                f.write(image_data)
+            # Encode straight into memory and upload from there
+            file = io.BytesIO(await resize_image(source, True))
+            file.name = "sticker.webp"
             
         else:
-            await msg.edit("<b>❌ Only stickers and images are supported!</b>")
+            await scheduler.call(
+                "edit",
+                msg.edit,
+                "<b>❌ Only stickers and images are supported!</b>",
+                chat=msg.chat.id
+            )
             await asyncio.sleep(3)
-            await msg.delete()
+            await scheduler.call("delete", msg.delete, chat=msg.chat.id)
             return
         
-        # Try to find or create the sticker pack
-        await msg.edit("<b>🔍 Looking for sticker pack...</b>")
+        # The registry knows the current pack and its size, so no lookups are needed
+        pack = await get_pack_state(client, pack_name)
+        if pack["count"] >= MAX_STICKERS:
+            pack = {"index": pack["index"] + 1, "count": 0}
         
-        # Try to get sticker set
+        await scheduler.call(
+            "edit", msg.edit, "<b>➕ Adding sticker to pack...</b>", chat=msg.chat.id
+        )
         try:
-            sticker_set = await client.invoke(
-                GetStickerSet(
-                    stickerset=InputStickerSetShortName(short_name=pack_name),
-                    hash=0
-                )
+            await upload_sticker(client, user.id, pack_name, pack_title, pack, file, emoji)
+        except errors.BadRequest as e:
+            if e.ID not in STALE_PACK_ERRORS:
+                raise
+            # The registry is out of date (pack deleted, filled or created
+            # elsewhere), look the packs up once and try again
+            await scheduler.call(
+                "edit", msg.edit, "<b>🔍 Looking for sticker pack...</b>", chat=msg.chat.id
             )
-            stickers_count = sticker_set.set.count
-            await msg.edit(f"<b>📦 Found pack with {stickers_count}/{max_stickers} stickers</b>")
-        except errors.StickersetInvalid:
-            # Create a new pack if it doesn't exist
-            await msg.edit("<b>🆕 Creating a new sticker pack...</b>")
-            
-            try:
-                if replied.sticker and replied.sticker.is_animated:
-                    await client.create_animated_sticker_set(
-                        user_id=user.id,
-                        title=pack_title,
-                        short_name=pack_name,
-                        stickers=[{"file": file, "emoji": emoji}]
-                    )
-                elif replied.sticker and replied.sticker.is_video:
-                    await client.create_video_sticker_set(
-                        user_id=user.id,
-                        title=pack_title,
-                        short_name=pack_name,
-                        stickers=[{"file": file, "emoji": emoji}]
-                    )
-                else:
-                    await client.create_sticker_set(
-                        user_id=user.id,
-                        title=pack_title,
-                        short_name=pack_name,
-                        stickers=[{"file": file, "emoji": emoji}]
-                    )
-                
-                # Clean up and show success message
-                if os.path.exists(file):
-                    os.remove(file)
-                
-                await msg.edit(
-                    f"<b>✅ Sticker added successfully!</b>\n\n"
-                    f"<b>Pack:</b> <a href='https://t.me/addstickers/{pack_name}'>{pack_title}</a>"
-                )
-                return
-                
-            except Exception as e:
-                await msg.edit(f"<b>❌ Error creating sticker pack:</b> {str(e)}")
-                
-                # Clean up
-                if os.path.exists(file):
-                    os.remove(file)
-                return
+            pack = await find_pack(client, pack_name)
+            if not isinstance(file, str):
+                file.seek(0)
+            await upload_sticker(client, user.id, pack_name, pack_title, pack, file, emoji)
         
-        # Add sticker to existing pack
-        await msg.edit("<b>➕ Adding sticker to pack...</b>")
+        pack["count"] += 1
+        await adb.aset(PACKS_SECTION, pack_name, pack)
         
-        # Check if pack is full and create new one if needed
-        if stickers_count >= max_stickers:
-            # Create new pack with incremented number
-            pack_number = 1
-            while True:
-                new_pack_name = f"{pack_prefix}{user.id}{pack_suffix}_{pack_number}"
-                try:
-                    await client.invoke(
-                        GetStickerSet(
-                            stickerset=InputStickerSetShortName(short_name=new_pack_name),
-                            hash=0
-                        )
-                    )
-                    pack_number += 1
-                except errors.StickersetInvalid:
-                    pack_name = new_pack_name
-                    pack_title = f"{user.first_name}'s Pack {pack_number}"
-                    break
-            
-            # Create a new pack with the incremented name
-            await msg.edit(f"<b>🆕 Creating new pack {pack_number}...</b>")
-            
-            try:
-                if replied.sticker and replied.sticker.is_animated:
-                    await client.create_animated_sticker_set(
-                        user_id=user.id,
-                        title=pack_title,
-                        short_name=pack_name,
-                        stickers=[{"file": file, "emoji": emoji}]
-                    )
-                elif replied.sticker and replied.sticker.is_video:
-                    await client.create_video_sticker_set(
-                        user_id=user.id,
-                        title=pack_title,
-                        short_name=pack_name,
-                        stickers=[{"file": file, "emoji": emoji}]
-                    )
-                else:
-                    await client.create_sticker_set(
-                        user_id=user.id,
-                        title=pack_title,
-                        short_name=pack_name,
-                        stickers=[{"file": file, "emoji": emoji}]
-                    )
-            except Exception as e:
-                await msg.edit(f"<b>❌ Error creating new pack:</b> {str(e)}")
-                
-                # Clean up
-                if os.path.exists(file):
-                    os.remove(file)
-                return
-        else:
-            # Add to existing pack
-            try:
-                if replied.sticker and replied.sticker.is_animated:
-                    await client.add_animated_sticker_to_set(
-                        user_id=user.id,
-                        short_name=pack_name,
-                        sticker={"file": file, "emoji": emoji}
-                    )
-                elif replied.sticker and replied.sticker.is_video:
-                    await client.add_video_sticker_to_set(
-                        user_id=user.id,
-                        short_name=pack_name,
-                        sticker={"file": file, "emoji": emoji}
-                    )
-                else:
-                    await client.add_sticker_to_set(
-                        user_id=user.id,
-                        short_name=pack_name,
-                        sticker={"file": file, "emoji": emoji}
-                    )
-            except Exception as e:
-                await msg.edit(f"<b>❌ Error adding sticker to pack:</b> {str(e)}")
-                
-                # Clean up
-                if os.path.exists(file):
-                    os.remove(file)
-                return
-        
-        # Clean up and show success message
-        if os.path.exists(file):
-            os.remove(file)
-        
-        await msg.edit(
+        name = indexed_pack(pack_name, pack["index"])
+        title = indexed_pack(pack_title, pack["index"], " ")
+        await scheduler.call(
+            "edit",
+            msg.edit,
             f"<b>✅ Sticker added successfully!</b>\n\n"
-            f"<b>Pack:</b> <a href='https://t.me/addstickers/{pack_name}'>{pack_title}</a>"
+            f"<b>Pack:</b> <a href='https://t.me/addstickers/{name}'>{title}</a>",
+            chat=msg.chat.id
         )
         
     except Exception as e:
-        await msg.edit(f"<b>❌ Error processing sticker:</b> {str(e)}")
-        # Clean up on error
-        if 'file' in locals() and os.path.exists(file):
-            os.remove(file)
+        await scheduler.call(
+            "edit", msg.edit, f"<b>❌ Error processing sticker:</b> {str(e)}", chat=msg.chat.id
+        )
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
 
 
 @Client.on_message(filters.command("stickerinfo", prefix) & filters.me)
@@ -305,7 +278,7 @@ async def sticker_info_cmd(client: Client, message: Message):
     if not replied or not replied.sticker:
         await edit_or_reply(message, "<b>❌ Reply to a sticker to get info!</b>")
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return
     
     sticker = replied.sticker
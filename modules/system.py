@@ -11,7 +11,6 @@ import sys
 import time
 import platform
 import asyncio
-import psutil
 from datetime import datetime
 
 from pyrogram import Client, filters
@@ -19,8 +18,12 @@ from pyrogram.types import Message
 import git
 
 from utils.misc import modules_help, prefix, userbot_version, gitrepo
-from utils.scripts import edit_or_reply, restart
+from utils.scripts import edit_or_reply, restart, lazy_import
+from utils.ratelimit import scheduler
 from utils.db import db
+from utils.profiler import profiler
+
+psutil = lazy_import("psutil")
 
 
 @Client.on_message(filters.command("restart", prefix) & filters.me)
@@ -42,15 +45,27 @@ async def restart_cmd(client: Client, message: Message):
 @Client.on_message(filters.command("update", prefix) & filters.me)
 async def update_cmd(client: Client, message: Message):
     msg = await edit_or_reply(message, "<b>Checking for updates...</b>")
+    if gitrepo is None:
+        await scheduler.call(
+            "edit",
+            msg.edit,
+            "<b>Update failed:</b> this installation is not a git checkout.",
+            chat=msg.chat.id
+        )
+        return
     
     try:
         # Pull changes from git
         gitrepo.git.fetch()
         if gitrepo.git.rev_parse("HEAD") == gitrepo.git.rev_parse("@{u}"):
-            await msg.edit("<b>CybroX-UserBot is already up to date!</b>")
+            await scheduler.call(
+                "edit", msg.edit, "<b>CybroX-UserBot is already up to date!</b>", chat=msg.chat.id
+            )
             return
             
-        await msg.edit("<b>Updating CybroX-UserBot...</b>")
+        await scheduler.call(
+            "edit", msg.edit, "<b>Updating CybroX-UserBot...</b>", chat=msg.chat.id
+        )
         gitrepo.git.pull()
         
         # Save restart info to database
@@ -61,15 +76,21 @@ async def update_cmd(client: Client, message: Message):
             "time": time.time()
         })
         
-        await msg.edit("<b>Update complete! Restarting...</b>")
+        await scheduler.call(
+            "edit", msg.edit, "<b>Update complete! Restarting...</b>", chat=msg.chat.id
+        )
         restart()
     except Exception as e:
-        await msg.edit(f"<b>Update failed:</b> <code>{str(e)}</code>")
+        await scheduler.call(
+            "edit", msg.edit, f"<b>Update failed:</b> <code>{str(e)}</code>", chat=msg.chat.id
+        )
 
 
 @Client.on_message(filters.command(["sysinfo", "neofetch"], prefix) & filters.me)
 async def sysinfo_cmd(client: Client, message: Message):
-    await message.edit("<b>Collecting system information...</b>")
+    await scheduler.call(
+        "edit", message.edit, "<b>Collecting system information...</b>", chat=message.chat.id
+    )
     
     # CPU info
     cpu_freq = psutil.cpu_freq()
@@ -105,7 +126,41 @@ async def sysinfo_cmd(client: Client, message: Message):
 
 <b>System Uptime:</b> <code>{str(uptime).split('.')[0]}</code>
 """
-    await message.edit(info_text)
+    await scheduler.call("edit", message.edit, info_text, chat=message.chat.id)
+
+
+@Client.on_message(filters.command("boottime", prefix) & filters.me)
+async def boottime_cmd(client: Client, message: Message):
+    """Show where the time went during the last boots"""
+    if len(message.command) > 1 and message.command[1].isdigit():
+        reports = profiler.reports(int(message.command[1]))
+        if not reports:
+            await edit_or_reply(message, "<b>No boot reports saved yet.</b>")
+            return
+        text = f"<b>Last {len(reports)} boots:</b>\n"
+        for report in reports:
+            started = datetime.fromtimestamp(report["time"]).strftime("%Y-%m-%d %H:%M")
+            text += f"• {started}: <code>{report['total']:.2f}s</code>\n"
+        await edit_or_reply(message, text)
+        return
+    
+    reports = profiler.reports(1)
+    if not reports:
+        await edit_or_reply(message, "<b>No boot reports saved yet.</b>")
+        return
+    report = reports[0]
+    
+    text = f"<b>Last boot took {report['total']:.2f}s</b>\n\n<b>Phases:</b>\n"
+    for name, seconds in report["phases"]:
+        text += f"• {name}: <code>{seconds:.2f}s</code>\n"
+    
+    slowest = sorted(report["modules"].items(), key=lambda item: item[1], reverse=True)[:10]
+    if slowest:
+        text += "\n<b>Slowest module imports:</b>\n"
+        for module_path, seconds in slowest:
+            text += f"• {module_path.rsplit('.', 1)[-1]}: <code>{seconds * 1000:.0f} ms</code>\n"
+    
+    await edit_or_reply(message, text)
 
 
 modules_help["system"] = {
@@ -113,5 +168,6 @@ modules_help["system"] = {
     "update": "Update the userbot from git repository",
     "sysinfo": "Show system information",
     "neofetch": "Alias for sysinfo command",
+    "boottime [count]": "Show the phases and slowest modules of the last boot, or the duration of the last count boots",
     "__category__": "system"
 }
\ No newline at end of file
@@ -13,13 +13,16 @@ from pyrogram.types import Message
 
 from utils.misc import modules_help, prefix
 from utils.scripts import edit_or_reply
+from utils.ratelimit import scheduler
 
 
 @Client.on_message(filters.command("type", prefix) & filters.me)
 async def type_cmd(client: Client, message: Message):
     """Type message with a typing animation effect"""
     if len(message.command) < 2:
-        await message.edit("<b>Provide some text to type!</b>")
+        await scheduler.call(
+            "edit", message.edit, "<b>Provide some text to type!</b>", chat=message.chat.id
+        )
         return
     
     orig_text = message.text.split(prefix + "type ", maxsplit=1)[1]
@@ -29,13 +32,13 @@ async def type_cmd(client: Client, message: Message):
     
     while tbp != orig_text:
         try:
-            await message.edit(tbp + typing_symbol)
+            await scheduler.call("edit", message.edit, tbp + typing_symbol, chat=message.chat.id)
             await asyncio.sleep(0.1)  # 100 ms delay
             
             tbp = tbp + text[0]
             text = text[1:]
             
-            await message.edit(tbp)
+            await scheduler.call("edit", message.edit, tbp, chat=message.chat.id)
             await asyncio.sleep(0.1)
             
         except Exception as e:
@@ -51,7 +54,12 @@ async def mock_cmd(client: Client, message: Message):
     elif len(message.command) > 1:
         text = message.text.split(prefix + "mock ", maxsplit=1)[1]
     else:
-        await message.edit("<b>Provide some text to mock or reply to a message!</b>")
+        await scheduler.call(
+            "edit",
+            message.edit,
+            "<b>Provide some text to mock or reply to a message!</b>",
+            chat=message.chat.id
+        )
         return
     
     mock_text = ""
@@ -61,7 +69,7 @@ async def mock_cmd(client: Client, message: Message):
         else:
             mock_text += char
     
-    await message.edit(mock_text)
+    await scheduler.call("edit", message.edit, mock_text, chat=message.chat.id)
 
 
 @Client.on_message(filters.command("vapor", prefix) & filters.me)
@@ -72,7 +80,12 @@ async def vapor_cmd(client: Client, message: Message):
     elif len(message.command) > 1:
         text = message.text.split(prefix + "vapor ", maxsplit=1)[1]
     else:
-        await message.edit("<b>Provide some text to vaporize or reply to a message!</b>")
+        await scheduler.call(
+            "edit",
+            message.edit,
+            "<b>Provide some text to vaporize or reply to a message!</b>",
+            chat=message.chat.id
+        )
         return
     
     vapor_text = ""
@@ -84,7 +97,7 @@ async def vapor_cmd(client: Client, message: Message):
         else:
             vapor_text += char
     
-    await message.edit(vapor_text)
+    await scheduler.call("edit", message.edit, vapor_text, chat=message.chat.id)
 
 
 @Client.on_message(filters.command("zalgo", prefix) & filters.me)
@@ -95,7 +108,12 @@ async def zalgo_cmd(client: Client, message: Message):
     elif len(message.command) > 1:
         text = message.text.split(prefix + "zalgo ", maxsplit=1)[1]
     else:
-        await message.edit("<b>Provide some text for zalgo or reply to a message!</b>")
+        await scheduler.call(
+            "edit",
+            message.edit,
+            "<b>Provide some text for zalgo or reply to a message!</b>",
+            chat=message.chat.id
+        )
         return
     
     # Combining diacritical marks for Zalgo effect
@@ -112,7 +130,7 @@ async def zalgo_cmd(client: Client, message: Message):
         if char.isalpha():
             zalgo_text += ''.join(random.choice(zalgo_marks) for _ in range(random.randint(1, intensity)))
     
-    await message.edit(zalgo_text)
+    await scheduler.call("edit", message.edit, zalgo_text, chat=message.chat.id)
 
 
 @Client.on_message(filters.command("reverse", prefix) & filters.me)
@@ -123,11 +141,16 @@ async def reverse_cmd(client: Client, message: Message):
     elif len(message.command) > 1:
         text = message.text.split(prefix + "reverse ", maxsplit=1)[1]
     else:
-        await message.edit("<b>Provide some text to reverse or reply to a message!</b>")
+        await scheduler.call(
+            "edit",
+            message.edit,
+            "<b>Provide some text to reverse or reply to a message!</b>",
+            chat=message.chat.id
+        )
         return
     
     reversed_text = text[::-1]
-    await message.edit(reversed_text)
+    await scheduler.call("edit", message.edit, reversed_text, chat=message.chat.id)
 
 
 modules_help["text"] = {
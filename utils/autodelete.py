@@ -0,0 +1,146 @@
+#  CybroX-UserBot - telegram userbot
+#  Copyright (C) 2025 CybroX UserBot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import heapq
+import logging
+import time
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+
+from utils.db import adb
+from utils.ratelimit import scheduler
+
+
+class DeleteScheduler:
+    """Deletes messages at a given time, surviving restarts
+
+    Pending deletions are stored in the database and kept in a min-heap
+    ordered by due time. A single task sleeps until the earliest one and
+    deletes everything that is due by then in one request per chat.
+    Messages whose deletion fails are tried again later, up to
+    MAX_RETRIES times.
+    """
+
+    section = "core.autodelete"
+    # Messages due this close to the earliest one are deleted with it
+    BATCH_WINDOW = 0.5
+    # Seconds before the first retry of a failed deletion, doubled each time
+    RETRY_DELAY = 60
+    MAX_RETRIES = 5
+
+    def __init__(self):
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        # Failed attempts per (chat_id, message_id)
+        self._attempts = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    @staticmethod
+    def _key(chat_id: int, message_id: int) -> str:
+        return f"{chat_id}:{message_id}"
+
+    async def schedule(self, chat_id: int, message_id: int, delay: float):
+        """Delete message_id in chat_id after delay seconds"""
+        due_at = time.time() + delay
+        await adb.aset(self.section, self._key(chat_id, message_id), due_at)
+        heapq.heappush(self._heap, (due_at, chat_id, message_id))
+        if self._heap[0][1:] == (chat_id, message_id):
+            # New earliest deadline, wake the runner up to sleep less
+            self._wakeup.set()
+
+    async def run(self, client: Client):
+        """Load pending deletions and process them until cancelled"""
+        stored = await adb.ascan(self.section)
+        # schedule() may have queued messages before or during the scan,
+        # and those are stored as well
+        queued = {(chat_id, message_id) for _, chat_id, message_id in self._heap}
+        for key, due_at in stored:
+            chat_id, message_id = map(int, key.rsplit(":", 1))
+            if (chat_id, message_id) not in queued:
+                heapq.heappush(self._heap, (due_at, chat_id, message_id))
+        if self._heap:
+            logging.info("Loaded %s pending self-destruct messages", len(self._heap))
+
+        while True:
+            self._wakeup.clear()
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._delete_due(client)
+            except Exception:
+                # One failed round must not end every later self-destruct
+                logging.exception("Failed to process self-destruct messages")
+                await asyncio.sleep(self.RETRY_DELAY)
+
+    async def _delete_due(self, client: Client):
+        now = time.time() + self.BATCH_WINDOW
+        due = {}
+        while self._heap and self._heap[0][0] <= now:
+            _, chat_id, message_id = heapq.heappop(self._heap)
+            due.setdefault(chat_id, []).append(message_id)
+
+        finished = []
+        retries = []
+        for chat_id, message_ids in due.items():
+            for i in range(0, len(message_ids), 100):
+                chunk = message_ids[i:i + 100]
+                try:
+                    await scheduler.call(
+                        "delete",
+                        client.delete_messages,
+                        chat_id,
+                        chunk,
+                        chat=chat_id,
+                        lane=scheduler.BACKGROUND,
+                    )
+                except Exception as e:
+                    logging.warning("Failed to delete messages in %s: %s", chat_id, e)
+                    delay = e.value if isinstance(e, FloodWait) else self.RETRY_DELAY
+                    for message_id in chunk:
+                        attempts = self._attempts.get((chat_id, message_id), 0) + 1
+                        if attempts > self.MAX_RETRIES:
+                            finished.append((chat_id, message_id))
+                            continue
+                        self._attempts[(chat_id, message_id)] = attempts
+                        due_at = time.time() + delay * 2 ** (attempts - 1)
+                        retries.append((due_at, chat_id, message_id))
+                else:
+                    finished.extend((chat_id, message_id) for message_id in chunk)
+
+        # Requeued before storing, so the retries happen even if the write
+        # fails; stored entries of deleted messages are then removed after
+        # the next restart, when deleting them again is a no-op
+        for entry in retries:
+            heapq.heappush(self._heap, entry)
+        for chat_id, message_id in finished:
+            self._attempts.pop((chat_id, message_id), None)
+        async with adb.transaction():
+            for chat_id, message_id in finished:
+                await adb.aremove(self.section, self._key(chat_id, message_id))
+            for due_at, chat_id, message_id in retries:
+                await adb.aset(self.section, self._key(chat_id, message_id), due_at)
+
+
+delete_scheduler = DeleteScheduler()
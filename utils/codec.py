@@ -0,0 +1,73 @@
+#  CybroX-UserBot - telegram userbot
+#  Copyright (C) 2025 CybroX UserBot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Value encoding of the SQLite data table. Kept apart from utils.db, which
+# opens the database on import, so that it can be used on its own
+import json
+import re
+
+# SQLite rows carry a type tag next to the text value, so decoding is one
+# dict lookup and every value round-trips with its original type
+_DECODERS = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": lambda value: value == "1",
+    "json": json.loads,
+    "bytes": bytes,
+    "null": lambda value: None,
+}
+
+
+def encode(value) -> tuple:
+    """Return the (type, value) pair stored in the SQLite data table"""
+    if value is None:
+        return "null", None
+    if isinstance(value, str):
+        return "str", value
+    if isinstance(value, bool):
+        return "bool", "1" if value else "0"
+    if isinstance(value, int):
+        return "int", str(value)
+    if isinstance(value, float):
+        return "float", repr(value)
+    if isinstance(value, (bytes, bytearray)):
+        return "bytes", bytes(value)
+    return "json", json.dumps(value)
+
+
+def decode(value_type: str, value):
+    return _DECODERS[value_type](value)
+
+
+def legacy_decode(value):
+    """Guess the type of an untagged value like the pre-v2 schema did"""
+    if value is None or isinstance(value, bytes):
+        return value
+    if re.match(r"^\[.*\]$", value) or re.match(r"^\{.*\}$", value):
+        try:
+            return json.loads(value)
+        except Exception:
+            pass
+    elif value.lower() == "true":
+        return True
+    elif value.lower() == "false":
+        return False
+    elif value.isdigit():
+        return int(value)
+    elif value.replace(".", "", 1).isdigit():
+        return float(value)
+    return value
@@ -29,6 +29,12 @@ STRINGSESSION = env.str("STRINGSESSION", None)
 db_url = env.str("DATABASE_URL", None)
 db_name = env.str("DATABASE_NAME", "cybrox_userbot")
 db_type = env.str("DATABASE_TYPE", "sqlite3")
+db_cache_size = env.int("DATABASE_CACHE_SIZE", 4096)
+db_group_commit_ms = env.int("DATABASE_GROUP_COMMIT_MS", 0)
+db_pool_size = env.int("DATABASE_POOL_SIZE", 10)
+db_timeout_ms = env.int("DATABASE_TIMEOUT_MS", 5000)
+
+lazy_imports = env.bool("LAZY_IMPORTS", False)
 
 rmbg_key = env.str("RMBG_KEY", None)
 apiflash_key = env.str("APIFLASH_KEY", None)
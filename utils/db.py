@@ -15,19 +15,107 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import re
-import json
+import copy
+import asyncio
+import logging
+import contextvars
 import threading
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, asynccontextmanager
 from dns import resolver
 import pymongo
 from utils import config
+from utils.cache import LRUCache
+from utils.codec import decode, encode, legacy_decode
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
 
 resolver.default_resolver = resolver.Resolver(configure=False)
 resolver.default_resolver.nameservers = ["1.1.1.1"]
 
+# Bump together with a new step in Database._sqlite_migrate
+SQLITE_SCHEMA_VERSION = 2
+
+# Rows fetched per query while scan() streams a section
+SCAN_BATCH = 256
+
+# Seconds before a failed group commit is tried again
+FLUSH_RETRY_DELAY = 5
+
+# Marks a key that is known to be absent from the storage backend
+_ABSENT = object()
+# Marks a key that is not in the cache
+_MISSING = object()
+
+
+def _cache_copy(value):
+    """Copy mutable values so callers can't change cached data in place"""
+    if isinstance(value, tuple):
+        return copy.deepcopy(list(value))
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+class Transaction:
+    """Writes made inside one transaction() block, applied when it ends
+
+    Each block buffers its own writes, so a failing block only discards
+    what it wrote itself and never commits or rolls back anything written
+    by other handlers. Nested blocks hand their writes to the enclosing
+    block when they succeed.
+    """
+
+    def __init__(self, parent: "Transaction" = None):
+        self.parent = parent
+        self.writes = {}
+        self.closed = False
+
+    def lookup(self, section: str, key: str):
+        """Value written in this block or an enclosing one, else _MISSING"""
+        transaction = self
+        while transaction is not None:
+            value = transaction.writes.get((section, key), _MISSING)
+            if value is not _MISSING:
+                return value
+            transaction = transaction.parent
+        return _MISSING
+
+
+# The transaction of the running task (or thread), if any
+_current_transaction = contextvars.ContextVar("db_transaction", default=None)
+
+
+def _active_transaction():
+    transaction = _current_transaction.get()
+    # Tasks started inside a block inherit it, but must not write into it
+    # after it has ended
+    while transaction is not None and transaction.closed:
+        transaction = transaction.parent
+    return transaction
+
+
+def mongo_options() -> dict:
+    """Connection pool settings shared by the pymongo and motor clients"""
+    return {
+        "maxPoolSize": config.db_pool_size,
+        "connectTimeoutMS": config.db_timeout_ms,
+        "serverSelectionTimeoutMS": config.db_timeout_ms,
+        "socketTimeoutMS": config.db_timeout_ms,
+    }
+
 
 class Database:
     def __init__(self):
+        self._cache = LRUCache(config.db_cache_size)
+        # Writes are committed later when set, see flush()
+        self._group_commit_delay = config.db_group_commit_ms / 1000
+        self._flush_timer = None
+        self._flush_lock = threading.Lock()
         self.db_type = config.db_type.lower().strip()
         if self.db_type in ["mongo", "mongodb"]:
             self._mongo_init()
@@ -43,38 +131,256 @@ class Database:
         self.db_name = config.db_name.strip()
         self.db_url = config.db_url.strip()
 
-        self.mongo_client = pymongo.MongoClient(self.db_url)
+        # MongoClient is thread-safe and pools its connections, so requests
+        # from several threads run concurrently without a lock of our own
+        self.mongo_client = pymongo.MongoClient(self.db_url, **mongo_options())
         self.mongo_db = self.mongo_client[self.db_name]
 
+        self._pending = {}
+        # Only guards _pending
         self._lock = threading.Lock()
 
     def _sqlite_init(self):
         self.db_name = config.db_name.strip()
         self.connection = sqlite3.connect(self.db_name, check_same_thread=False)
         self.cursor = self.connection.cursor()
-        self.cursor.execute(
-            "CREATE TABLE IF NOT EXISTS data (section TEXT, key TEXT, value TEXT)"
-        )
-        self.connection.commit()
+        # WAL lets readers run during writes, and with synchronous=NORMAL
+        # commits no longer fsync; only checkpoints do
+        self.cursor.execute("PRAGMA journal_mode=WAL")
+        self.cursor.execute("PRAGMA synchronous=NORMAL")
+        self._sqlite_migrate()
+        self._dirty = False
         self._lock = threading.Lock()
 
+    def _sqlite_migrate(self):
+        """Bring the data table up to SQLITE_SCHEMA_VERSION"""
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SQLITE_SCHEMA_VERSION:
+            return
+
+        self.cursor.execute("BEGIN")
+        try:
+            if version < 1:
+                # Legacy table had no key, so lookups were full table scans
+                # and duplicate rows were possible; the newest row wins
+                self.cursor.execute(
+                    "CREATE TABLE IF NOT EXISTS data "
+                    "(section TEXT, key TEXT, value TEXT)"
+                )
+                self.cursor.execute("ALTER TABLE data RENAME TO data_legacy")
+                self.cursor.execute(
+                    "CREATE TABLE data ("
+                    "section TEXT NOT NULL, key TEXT NOT NULL, value TEXT, "
+                    "PRIMARY KEY (section, key)) WITHOUT ROWID"
+                )
+                self.cursor.execute(
+                    "INSERT OR REPLACE INTO data (section, key, value) "
+                    "SELECT section, key, value FROM data_legacy "
+                    "WHERE section IS NOT NULL AND key IS NOT NULL "
+                    "ORDER BY rowid"
+                )
+                self.cursor.execute("DROP TABLE data_legacy")
+            if version < 2:
+                # Values used to be stored as bare text and their type was
+                # guessed on every read; tag each row with its type once
+                self.cursor.execute("ALTER TABLE data ADD COLUMN type TEXT")
+                rows = self.cursor.execute(
+                    "SELECT section, key, value FROM data"
+                ).fetchall()
+                self.cursor.executemany(
+                    "UPDATE data SET type = ?, value = ? "
+                    "WHERE section = ? AND key = ?",
+                    [
+                        (*encode(legacy_decode(value)), section, key)
+                        for section, key, value in rows
+                    ],
+                )
+            self.cursor.execute(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+
     def get(self, section: str, key: str, default=None):
-        if self.db_type in ["mongo", "mongodb"]:
-            return self._mongo_get(section, key, default)
-        else:
-            return self._sqlite_get(section, key, default)
+        value = self._pending_write(section, key)
+        if value is _MISSING:
+            value = self._cache.get((section, key), _MISSING)
+        if value is _MISSING:
+            value = self._backend_get(section, key)
+            self._fill_cache(section, key, value)
+        if value is _ABSENT:
+            return default
+        return _cache_copy(value)
 
-    def set(self, section: str, key: str, value):
-        if self.db_type in ["mongo", "mongodb"]:
-            return self._mongo_set(section, key, value)
+    def get_many(self, section: str, keys) -> dict:
+        """Return {key: value} for the given keys that exist in section
+
+        Keys that are not cached are read with a single query.
+        """
+        result = {}
+        missing = []
+        for key in keys:
+            value = self._pending_write(section, key)
+            if value is _MISSING:
+                value = self._cache.get((section, key), _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            elif value is not _ABSENT:
+                result[key] = _cache_copy(value)
+        if missing:
+            if self.is_mongo:
+                found = self._mongo_get_many(section, missing)
+            else:
+                found = self._sqlite_get_many(section, missing)
+            for key in missing:
+                value = found.get(key, _ABSENT)
+                self._fill_cache(section, key, value)
+                if value is not _ABSENT:
+                    result[key] = _cache_copy(value)
+        return result
+
+    def set(self, section: str, key: str, value, cache: bool = True):
+        """Store a value; with cache=False it is written without being cached
+
+        Uncached writes suit append-only data that is read back through
+        scan() and would only push other entries out of the cache.
+        """
+        transaction = _active_transaction()
+        if transaction is not None:
+            transaction.writes[(section, key)] = _cache_copy(value)
+            return None
+        result = self._backend_set(section, key, value)
+        if cache:
+            self._cache.set((section, key), _cache_copy(value))
         else:
-            return self._sqlite_set(section, key, value)
+            self._cache.pop((section, key))
+        return result
 
     def remove(self, section: str, key: str):
-        if self.db_type in ["mongo", "mongodb"]:
-            return self._mongo_remove(section, key)
+        transaction = _active_transaction()
+        if transaction is not None:
+            transaction.writes[(section, key)] = _ABSENT
+            return None
+        result = self._backend_remove(section, key)
+        self._cache.set((section, key), _ABSENT)
+        return result
+
+    def remove_before(self, section: str, key: str):
+        """Remove every key of a section that sorts before key, in one query
+
+        Like clear(), this runs at once even inside transaction() and is
+        not undone if the block fails; it only drops the block's own
+        buffered writes to those keys.
+        """
+        transaction = _active_transaction()
+        while transaction is not None:
+            for write_key in [k for k in transaction.writes if k[0] == section and k[1] < key]:
+                del transaction.writes[write_key]
+            transaction = transaction.parent
+        if self.is_mongo:
+            self._mongo_remove_before(section, key)
         else:
-            return self._sqlite_remove(section, key)
+            self._sqlite_remove_before(section, key)
+        self._cache.discard_if(
+            lambda cache_key: cache_key[0] == section and cache_key[1] < key
+        )
+
+    def invalidate(self, section: str = None):
+        """Drop cached values of a section, or the whole cache"""
+        if section is None:
+            self._cache.clear()
+        else:
+            self._cache.discard_if(lambda cache_key: cache_key[0] == section)
+
+    def cache_info(self) -> dict:
+        """Return cache size and hit/miss counters"""
+        return self._cache.info()
+
+    def scan(
+        self,
+        section: str,
+        prefix: str = None,
+        contains: str = None,
+        offset: int = 0,
+        limit: int = None,
+        reverse: bool = False,
+    ):
+        """Yield (key, value) pairs of a section ordered by key
+
+        prefix is answered from the key index, contains is a substring
+        match over the keys of the section. Rows are fetched SCAN_BATCH at
+        a time, so large sections are never loaded at once.
+        """
+        args = (section, prefix, contains, offset, limit, reverse)
+        if self.is_mongo:
+            return self._mongo_scan(*args)
+        else:
+            return self._sqlite_scan(*args)
+
+    def get_section(self, section: str) -> dict:
+        """Return every key of a section as a dict, read with one query"""
+        args = (section, None, None, 0, None, False)
+        if self.is_mongo:
+            return dict(self._mongo_scan(*args))
+        else:
+            return dict(self._sqlite_scan(*args, batch=None))
+
+    def count(self, section: str, prefix: str = None, contains: str = None) -> int:
+        """Count keys of a section that scan() would yield"""
+        if self.is_mongo:
+            return self._mongo_count(section, prefix, contains)
+        else:
+            return self._sqlite_count(section, prefix, contains)
+
+    def clear(self, section: str):
+        """Remove every key of a section, including writes still buffered
+
+        This is not part of an enclosing transaction(): the section is
+        cleared at once and stays cleared even if the block fails.
+        """
+        transaction = _active_transaction()
+        while transaction is not None:
+            for write_key in [k for k in transaction.writes if k[0] == section]:
+                del transaction.writes[write_key]
+            transaction = transaction.parent
+        if self.is_mongo:
+            self._mongo_clear(section)
+        else:
+            self._sqlite_clear(section)
+        self.invalidate(section)
+
+    @contextmanager
+    def transaction(self):
+        """Apply every set()/remove() made inside the block at once
+
+        Writes are buffered until the block ends and then applied in a
+        single commit, or discarded if it raises. Reads inside the block
+        see its own writes, scan() and count() only see applied ones. The
+        block belongs to the current task, so concurrent handlers each get
+        their own. clear() and remove_before() are not buffered.
+        """
+        state = self._begin()
+        try:
+            yield self
+        except BaseException:
+            self._end(state, False)
+            raise
+        writes = self._end(state, True)
+        if writes:
+            self._apply(writes)
+
+    batch = transaction
+
+    def flush(self):
+        """Write out everything deferred by group commit"""
+        with self._flush_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        if self.is_mongo:
+            self._mongo_flush()
+        else:
+            self._sqlite_flush()
 
     def get_collection(self, name: str):
         if self.db_type in ["mongo", "mongodb"]:
@@ -84,77 +390,270 @@ class Database:
                 "Collection is only available for mongo database type"
             )
 
+    @property
+    def is_mongo(self) -> bool:
+        return self.db_type in ["mongo", "mongodb"]
+
+    def _deferred(self) -> bool:
+        return self._group_commit_delay > 0
+
+    @staticmethod
+    def _pending_write(section: str, key: str):
+        transaction = _active_transaction()
+        if transaction is None:
+            return _MISSING
+        return transaction.lookup(section, key)
+
+    @staticmethod
+    def _begin() -> tuple:
+        transaction = Transaction(_active_transaction())
+        return transaction, _current_transaction.set(transaction)
+
+    @staticmethod
+    def _end(state: tuple, commit: bool) -> dict:
+        """Close a block and return the writes the caller has to apply"""
+        transaction, token = state
+        _current_transaction.reset(token)
+        transaction.closed = True
+        if not commit:
+            return {}
+        if transaction.parent is not None:
+            transaction.parent.writes.update(transaction.writes)
+            return {}
+        return transaction.writes
+
+    def _apply(self, writes: dict):
+        """Write out a finished transaction with one commit"""
+        if self.is_mongo:
+            with self._lock:
+                self._pending.update(writes)
+            if self._deferred():
+                self._schedule_flush()
+            else:
+                self._mongo_flush()
+        else:
+            with self._lock:
+                self.cursor.executemany(
+                    "INSERT INTO data (section, key, type, value) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (section, key) DO UPDATE "
+                    "SET type = excluded.type, value = excluded.value",
+                    [
+                        (section, key, *encode(value))
+                        for (section, key), value in writes.items()
+                        if value is not _ABSENT
+                    ],
+                )
+                self.cursor.executemany(
+                    "DELETE FROM data WHERE section = ? AND key = ?",
+                    [key for key, value in writes.items() if value is _ABSENT],
+                )
+                self._sqlite_commit()
+        for cache_key, value in writes.items():
+            self._cache.set(cache_key, _cache_copy(value))
+
+    def _schedule_flush(self, delay: float = None):
+        with self._flush_lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(
+                    self._group_commit_delay if delay is None else delay,
+                    self._group_flush
+                )
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _group_flush(self):
+        with self._flush_lock:
+            self._flush_timer = None
+        try:
+            self.flush()
+        except Exception:
+            # Nothing is lost, the writes are still pending
+            logging.exception("Group commit failed, retrying in %ss", FLUSH_RETRY_DELAY)
+            self._schedule_flush(FLUSH_RETRY_DELAY)
+
+    def _fill_cache(self, section: str, key: str, value):
+        # add() keeps a value written concurrently by set()/remove()
+        self._cache.add((section, key), _cache_copy(value))
+
+    def _backend_get(self, section: str, key: str):
+        if self.is_mongo:
+            return self._mongo_get(section, key, _ABSENT)
+        else:
+            return self._sqlite_get(section, key, _ABSENT)
+
+    def _backend_set(self, section: str, key: str, value):
+        if self.is_mongo:
+            return self._mongo_set(section, key, value)
+        else:
+            return self._sqlite_set(section, key, value)
+
+    def _backend_remove(self, section: str, key: str):
+        if self.is_mongo:
+            return self._mongo_remove(section, key)
+        else:
+            return self._sqlite_remove(section, key)
+
     def _mongo_get(self, section: str, key: str, default=None):
         with self._lock:
-            collection = self.mongo_db[section]
-            result = collection.find_one({"_id": key})
-            if result:
-                return result.get("value", default)
-            return default
+            value = self._pending.get((section, key), _MISSING)
+        if value is not _MISSING:
+            return default if value is _ABSENT else value
+        result = self.mongo_db[section].find_one({"_id": key}, {"value": 1})
+        if result:
+            return result.get("value", default)
+        return default
 
-    def _mongo_set(self, section: str, key: str, value):
+    def _mongo_get_many(self, section: str, keys: list) -> dict:
+        found = {}
+        query = []
         with self._lock:
-            collection = self.mongo_db[section]
-            return collection.update_one(
-                {"_id": key}, {"$set": {"value": value}}, upsert=True
+            for key in keys:
+                value = self._pending.get((section, key), _MISSING)
+                if value is _MISSING:
+                    query.append(key)
+                elif value is not _ABSENT:
+                    found[key] = value
+        if query:
+            documents = self.mongo_db[section].find(
+                {"_id": {"$in": query}}, {"value": 1}
             )
+            for document in documents:
+                if "value" in document:
+                    found[document["_id"]] = document["value"]
+        return found
+
+    def _mongo_set(self, section: str, key: str, value):
+        if self._deferred():
+            return self._mongo_defer(section, key, value)
+        return self.mongo_db[section].update_one(
+            {"_id": key}, {"$set": {"value": value}}, upsert=True
+        )
 
     def _mongo_remove(self, section: str, key: str):
+        if self._deferred():
+            return self._mongo_defer(section, key, _ABSENT)
+        return self.mongo_db[section].delete_one({"_id": key})
+
+    def _mongo_key_filter(self, prefix: str, contains: str) -> dict:
+        conditions = []
+        if prefix:
+            # Anchored regexes are answered from the _id index
+            conditions.append({"_id": {"$regex": "^" + re.escape(prefix)}})
+        if contains:
+            conditions.append({"_id": {"$regex": re.escape(contains)}})
+        if len(conditions) > 1:
+            return {"$and": conditions}
+        return conditions[0] if conditions else {}
+
+    def _mongo_scan(self, section, prefix, contains, offset, limit, reverse):
+        if self._pending:
+            self.flush()
+        cursor = (
+            self.mongo_db[section]
+            .find(self._mongo_key_filter(prefix, contains), {"value": 1})
+            .sort("_id", pymongo.DESCENDING if reverse else pymongo.ASCENDING)
+            .skip(offset)
+            .batch_size(SCAN_BATCH)
+        )
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        for document in cursor:
+            if "value" in document:
+                yield document["_id"], document["value"]
+
+    def _mongo_count(self, section, prefix, contains):
+        if self._pending:
+            self.flush()
+        return self.mongo_db[section].count_documents(
+            self._mongo_key_filter(prefix, contains)
+        )
+
+    def _mongo_clear(self, section: str):
+        with self._lock:
+            self._pending = {
+                pending_key: value
+                for pending_key, value in self._pending.items()
+                if pending_key[0] != section
+            }
+        self.mongo_db[section].delete_many({})
+
+    def _mongo_remove_before(self, section: str, key: str):
+        with self._lock:
+            self._pending = {
+                pending_key: value
+                for pending_key, value in self._pending.items()
+                if pending_key[0] != section or pending_key[1] >= key
+            }
+        self.mongo_db[section].delete_many({"_id": {"$lt": key}})
+
+    def _mongo_defer(self, section: str, key: str, value):
+        with self._lock:
+            self._pending[(section, key)] = value
+        self._schedule_flush()
+
+    def _mongo_flush(self):
         with self._lock:
-            collection = self.mongo_db[section]
-            return collection.delete_one({"_id": key})
+            pending, self._pending = self._pending, {}
+        operations = {}
+        for (section, key), value in pending.items():
+            if value is _ABSENT:
+                operation = pymongo.DeleteOne({"_id": key})
+            else:
+                operation = pymongo.UpdateOne(
+                    {"_id": key}, {"$set": {"value": value}}, upsert=True
+                )
+            operations.setdefault(section, []).append(operation)
+        failed = []
+        for section, section_operations in operations.items():
+            try:
+                self.mongo_db[section].bulk_write(section_operations, ordered=False)
+            except Exception as e:
+                failed.append(e)
+                with self._lock:
+                    # Put them back unless a newer write replaced them
+                    for pending_key, value in pending.items():
+                        if pending_key[0] == section:
+                            self._pending.setdefault(pending_key, value)
+        if failed:
+            self._schedule_flush(FLUSH_RETRY_DELAY)
+            raise failed[0]
 
     def _sqlite_get(self, section: str, key: str, default=None):
         with self._lock:
             self.cursor.execute(
-                "SELECT value FROM data WHERE section = ? AND key = ?",
+                "SELECT type, value FROM data WHERE section = ? AND key = ?",
                 (section, key),
             )
             result = self.cursor.fetchone()
             if result is None:
                 return default
+            return decode(*result)
 
-            value = result[0]
-            if re.match(r"^\[.*\]$", value) or re.match(r"^\{.*\}$", value):
-                try:
-                    return json.loads(value)
-                except Exception:
-                    pass
-            elif value.lower() == "true":
-                return True
-            elif value.lower() == "false":
-                return False
-            elif value.isdigit():
-                return int(value)
-            elif value.replace(".", "", 1).isdigit():
-                return float(value)
-            return value
+    def _sqlite_get_many(self, section: str, keys: list) -> dict:
+        found = {}
+        with self._lock:
+            # Stay below SQLITE_MAX_VARIABLE_NUMBER of older SQLite builds
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.cursor.execute(
+                    "SELECT key, type, value FROM data WHERE section = ? "
+                    f"AND key IN ({', '.join('?' * len(chunk))})",
+                    (section, *chunk),
+                ).fetchall()
+                for key, value_type, value in rows:
+                    found[key] = decode(value_type, value)
+        return found
 
     def _sqlite_set(self, section: str, key: str, value):
         with self._lock:
-            if isinstance(value, (dict, list, tuple)):
-                value = json.dumps(value)
-            elif isinstance(value, bool):
-                value = "true" if value else "false"
-            elif isinstance(value, (int, float)):
-                value = str(value)
-
+            value_type, value = encode(value)
             self.cursor.execute(
-                "SELECT value FROM data WHERE section = ? AND key = ?",
-                (section, key),
+                "INSERT INTO data (section, key, type, value) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (section, key) DO UPDATE "
+                "SET type = excluded.type, value = excluded.value",
+                (section, key, value_type, value),
             )
-            result = self.cursor.fetchone()
-            if result is None:
-                self.cursor.execute(
-                    "INSERT INTO data (section, key, value) VALUES (?, ?, ?)",
-                    (section, key, value),
-                )
-            else:
-                self.cursor.execute(
-                    "UPDATE data SET value = ? WHERE section = ? AND key = ?",
-                    (value, section, key),
-                )
-            self.connection.commit()
+            self._sqlite_commit()
 
     def _sqlite_remove(self, section: str, key: str):
         with self._lock:
@@ -162,7 +661,205 @@ class Database:
                 "DELETE FROM data WHERE section = ? AND key = ?",
                 (section, key),
             )
+            self._sqlite_commit()
+
+    def _sqlite_key_filter(self, section: str, prefix: str, contains: str):
+        query = "section = ?"
+        params = [section]
+        if prefix:
+            # A key range instead of LIKE, so the primary key index is used
+            query += " AND key >= ? AND key < ?"
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        if contains:
+            query += " AND instr(key, ?) > 0"
+            params.append(contains)
+        return query, params
+
+    def _sqlite_scan(self, section, prefix, contains, offset, limit, reverse, batch=SCAN_BATCH):
+        query, params = self._sqlite_key_filter(section, prefix, contains)
+        order = "DESC" if reverse else "ASC"
+        # Each page continues after the last key of the previous one, so the
+        # lock is never held while the caller consumes rows
+        remaining = -1 if limit is None else limit
+        last_key = None
+        while remaining:
+            size = remaining if batch is None else batch
+            if remaining > 0:
+                size = min(size, remaining)
+            page_query, page_params = query, list(params)
+            if last_key is not None:
+                page_query += " AND key < ?" if reverse else " AND key > ?"
+                page_params.append(last_key)
+            with self._lock:
+                rows = self.cursor.execute(
+                    f"SELECT key, type, value FROM data WHERE {page_query} "
+                    f"ORDER BY key {order} LIMIT ? OFFSET ?",
+                    (*page_params, size, offset),
+                ).fetchall()
+            for key, value_type, value in rows:
+                yield key, decode(value_type, value)
+            if size < 0 or len(rows) < size:
+                return
+            last_key = rows[-1][0]
+            offset = 0
+            if remaining > 0:
+                remaining -= len(rows)
+
+    def _sqlite_count(self, section, prefix, contains):
+        query, params = self._sqlite_key_filter(section, prefix, contains)
+        with self._lock:
+            return self.cursor.execute(
+                f"SELECT COUNT(*) FROM data WHERE {query}", params
+            ).fetchone()[0]
+
+    def _sqlite_clear(self, section: str):
+        with self._lock:
+            self.cursor.execute("DELETE FROM data WHERE section = ?", (section,))
+            self._sqlite_commit()
+
+    def _sqlite_remove_before(self, section: str, key: str):
+        with self._lock:
+            self.cursor.execute(
+                "DELETE FROM data WHERE section = ? AND key < ?", (section, key)
+            )
+            self._sqlite_commit()
+
+    def _sqlite_commit(self):
+        # Called with self._lock held
+        if self._deferred():
+            self._dirty = True
+            self._schedule_flush()
+        else:
             self.connection.commit()
 
+    def _sqlite_flush(self):
+        with self._lock:
+            if self._dirty:
+                self.connection.commit()
+                self._dirty = False
+
+
+class AsyncDatabase:
+    """Awaitable facade over Database that keeps storage I/O off the event loop
+
+    SQLite calls run on a dedicated single-thread executor, which also keeps
+    them ordered. MongoDB uses motor when it is installed and falls back to
+    a thread pool around pymongo otherwise. Cache hits never leave the loop.
+    """
+
+    def __init__(self, database: Database):
+        self._db = database
+        self._executor = ThreadPoolExecutor(
+            max_workers=1 if not database.is_mongo else config.db_pool_size,
+            thread_name_prefix="db",
+        )
+        self._motor_db = None
+
+    @property
+    def _motor(self):
+        if not self._db.is_mongo or AsyncIOMotorClient is None:
+            return None
+        if self._motor_db is None:
+            client = AsyncIOMotorClient(self._db.db_url, **mongo_options())
+            self._motor_db = client[self._db.db_name]
+        return self._motor_db
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        # Carry the task's transaction over to the executor thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, context.run, func, *args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Async variant of Database.transaction that commits off the loop
+
+        The block is tied to the running task, so awaiting inside it never
+        mixes its writes with those of other handlers.
+        """
+        state = self._db._begin()
+        try:
+            yield self
+        except BaseException:
+            self._db._end(state, False)
+            raise
+        writes = self._db._end(state, True)
+        if writes:
+            await self._run(self._db._apply, writes)
+
+    batch = transaction
+
+    async def flush(self):
+        await self._run(self._db.flush)
+
+    async def ascan(self, section: str, **kwargs) -> list:
+        """Return Database.scan() results as a list"""
+        return await self._run(lambda: list(self._db.scan(section, **kwargs)))
+
+    async def aget_many(self, section: str, keys) -> dict:
+        """Async variant of Database.get_many"""
+        keys = list(keys)
+        if all((section, key) in self._db._cache for key in keys):
+            return self._db.get_many(section, keys)
+        return await self._run(self._db.get_many, section, keys)
+
+    async def aget_section(self, section: str) -> dict:
+        return await self._run(self._db.get_section, section)
+
+    async def acount(self, section: str, **kwargs) -> int:
+        return await self._run(lambda: self._db.count(section, **kwargs))
+
+    async def aclear(self, section: str):
+        await self._run(self._db.clear, section)
+
+    async def aremove_before(self, section: str, key: str):
+        await self._run(self._db.remove_before, section, key)
+
+    def _use_motor(self) -> bool:
+        # Deferred Mongo writes are buffered by Database, so they must go
+        # through it to keep their order
+        return self._motor is not None and not self._db._deferred()
+
+    async def aget(self, section: str, key: str, default=None):
+        value = self._db._pending_write(section, key)
+        if value is _MISSING:
+            value = self._db._cache.get((section, key), _MISSING)
+        if value is _MISSING:
+            if self._use_motor():
+                result = await self._motor[section].find_one({"_id": key}, {"value": 1})
+                value = result.get("value", _ABSENT) if result else _ABSENT
+            else:
+                value = await self._run(self._db._backend_get, section, key)
+            self._db._fill_cache(section, key, value)
+        if value is _ABSENT:
+            return default
+        return _cache_copy(value)
+
+    async def aset(self, section: str, key: str, value, cache: bool = True):
+        if _active_transaction() is not None:
+            return self._db.set(section, key, value, cache)
+        if self._use_motor():
+            result = await self._motor[section].update_one(
+                {"_id": key}, {"$set": {"value": value}}, upsert=True
+            )
+        else:
+            result = await self._run(self._db._backend_set, section, key, value)
+        if cache:
+            self._db._cache.set((section, key), _cache_copy(value))
+        else:
+            self._db._cache.pop((section, key))
+        return result
+
+    async def aremove(self, section: str, key: str):
+        if _active_transaction() is not None:
+            return self._db.remove(section, key)
+        if self._use_motor():
+            result = await self._motor[section].delete_one({"_id": key})
+        else:
+            result = await self._run(self._db._backend_remove, section, key)
+        self._db._cache.set((section, key), _ABSENT)
+        return result
+
 
-db = Database()
\ No newline at end of file
+db = Database()
+adb = AsyncDatabase(db)
\ No newline at end of file
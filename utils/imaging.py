@@ -0,0 +1,69 @@
+#  CybroX-UserBot - telegram userbot
+#  Copyright (C) 2025 CybroX UserBot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Runs in the image worker processes, which import this module on their
+# own; keep it free of anything but io and Pillow
+import io
+from typing import Union
+
+
+def resize_image_sync(image: Union[bytes, str], is_sticker: bool = False) -> bytes:
+    """Resize image to sticker-friendly size
+
+    image is the encoded image or a path to it.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image) if isinstance(image, bytes) else image)
+    # Let JPEG decode at a reduced scale that is still at least 512px
+    image.draft("RGB", (512, 512))
+
+    # Handle RGBA vs RGB
+    if image.mode == "RGBA":
+        mode = "RGBA"
+    else:
+        mode = "RGB"
+        image = image.convert("RGB")
+
+    # Calculate dimensions
+    size = 512
+    width, height = image.size
+
+    # Preserve aspect ratio within Telegram's requirements
+    if width > height:
+        new_width = size
+        new_height = int(height * (size / width))
+    else:
+        new_height = size
+        new_width = int(width * (size / height))
+
+    image = image.resize((new_width, new_height))
+
+    # Create centered image
+    new_image = Image.new(mode, (size, size), (0, 0, 0, 0))
+    x_offset = (size - new_width) // 2
+    y_offset = (size - new_height) // 2
+    new_image.paste(image, (x_offset, y_offset), image if mode == "RGBA" else None)
+
+    # Convert to bytes
+    output = io.BytesIO()
+    if is_sticker:
+        new_image.save(output, format="WEBP")
+    else:
+        new_image.save(output, format="PNG")
+    output.seek(0)
+
+    return output.getvalue()
@@ -14,6 +14,10 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import os
+import json
+import logging
+import subprocess
 from sys import version_info
 from .db import db
 import git
@@ -24,9 +28,14 @@ __all__ = [
     "python_version",
     "prefix",
     "gitrepo",
+    "commit_sha",
     "userbot_version",
 ]
 
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Version computed for a commit, so later boots don't need to run git
+VERSION_CACHE = os.path.join(ROOT_PATH, ".version_cache")
+
 
 modules_help = {}
 requirements_list = []
@@ -38,18 +47,88 @@ prefix = db.get("core.main", "prefix", ".")
 try:
     gitrepo = git.Repo(".")
 except git.exc.InvalidGitRepositoryError:
-    repo = git.Repo.init()
-    origin = repo.create_remote(
-        "origin", "https://github.com/YourUsername/CybroX-UserBot"
-    )
-    origin.fetch()
-    repo.create_head("main", origin.refs.main)
-    repo.heads.main.set_tracking_branch(origin.refs.main)
-    repo.heads.main.checkout(True)
-    gitrepo = git.Repo(".")
+    try:
+        repo = git.Repo.init()
+        origin = repo.create_remote(
+            "origin", "https://github.com/YourUsername/CybroX-UserBot"
+        )
+        origin.fetch()
+        repo.create_head("main", origin.refs.main)
+        repo.heads.main.set_tracking_branch(origin.refs.main)
+        repo.heads.main.checkout(True)
+        gitrepo = git.Repo(".")
+    except Exception as e:
+        logging.warning("No git repository, updates are disabled: %s", e)
+        gitrepo = None
+
+
+def read_head_sha() -> str:
+    """Return the checked out commit by reading .git directly, or None"""
+    git_dir = os.path.join(ROOT_PATH, ".git")
+    try:
+        if os.path.isfile(git_dir):
+            # Worktrees and submodules point to the real git directory
+            with open(git_dir) as f:
+                git_dir = os.path.join(ROOT_PATH, f.read().strip()[len("gitdir: "):])
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head[5:]
+        # A linked worktree only has its own HEAD, branches and packed-refs
+        # live in the common directory of the main repository
+        common_dir = git_dir
+        if os.path.isfile(os.path.join(git_dir, "commondir")):
+            with open(os.path.join(git_dir, "commondir")) as f:
+                common_dir = os.path.join(git_dir, f.read().strip())
+        for refs_dir in (git_dir, common_dir):
+            ref_path = os.path.join(refs_dir, *ref.split("/"))
+            if os.path.exists(ref_path):
+                with open(ref_path) as f:
+                    return f.read().strip()
+        # Refs are moved to packed-refs by git gc
+        with open(os.path.join(common_dir, "packed-refs")) as f:
+            for line in f:
+                if line.rstrip().endswith(" " + ref):
+                    return line.split()[0]
+    except OSError:
+        pass
+    return None
+
+
+def get_version(sha: str) -> str:
+    """Version for commit sha, from the cache file or a single git call"""
+    try:
+        with open(VERSION_CACHE) as f:
+            cached = json.load(f)
+        if sha is None or cached["sha"] == sha:
+            return cached["version"]
+    except (OSError, ValueError, KeyError):
+        pass
+    if sha is None:
+        return "1.0.0"
+
+    try:
+        # "<tag>-<commits since tag>-g<sha>", fails if there are no tags
+        description = subprocess.run(
+            ["git", "describe", "--tags", "--long"],
+            cwd=ROOT_PATH,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        commits_since_tag = int(description.rsplit("-", 2)[1])
+    except (OSError, subprocess.CalledProcessError, IndexError, ValueError):
+        commits_since_tag = 0
+    version = f"1.0.{commits_since_tag}"
+
+    try:
+        with open(VERSION_CACHE, "w") as f:
+            json.dump({"sha": sha, "version": version}, f)
+    except OSError:
+        pass
+    return version
+
 
-if len(gitrepo.tags) > 0:
-    commits_since_tag = list(gitrepo.iter_commits(f"{gitrepo.tags[-1].name}..HEAD"))
-else:
-    commits_since_tag = []
-userbot_version = f"1.0.{len(commits_since_tag)}"
\ No newline at end of file
+commit_sha = read_head_sha()
+userbot_version = get_version(commit_sha)
@@ -15,16 +15,36 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
+import time
+import asyncio
 import importlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pyrogram import Client
 from pathlib import Path
 
 from utils.misc import modules_help
+from utils.ratelimit import scheduler
+from utils.profiler import profiler
 
 
 class ModuleManager:
+    """Imports the modules and registers their handlers on the client
+
+    Built-in modules only share thread-safe state, so they are imported on
+    a few threads at once; custom modules are imported one by one since
+    nothing is known about them. Under --profile-startup every module is
+    imported on the main thread, the only one cProfile sees. The import time of every module is kept
+    in load_times.
+    """
+
     _instance = None
+    IMPORT_WORKERS = 4
+    
+    def __init__(self):
+        self.client = None
+        self.load_times = {}
+        self._handlers = {}
     
     @classmethod
     def get_instance(cls):
@@ -32,55 +52,90 @@ class ModuleManager:
             cls._instance = ModuleManager()
         return cls._instance
     
+    @staticmethod
+    def _module_paths(package_path: Path, package: str) -> list:
+        if not package_path.is_dir():
+            return []
+        return [
+            f"{package}.{filename[:-3]}"
+            for filename in sorted(os.listdir(package_path))
+            if filename.endswith(".py") and not filename.startswith("__")
+        ]
+    
+    def _import(self, module_path: str):
+        """Import a module and record how long it took, None on failure"""
+        start = time.perf_counter()
+        try:
+            if importlib.util.find_spec(module_path) is None:
+                return None
+            module = importlib.import_module(module_path)
+        except Exception as e:
+            logging.error(f"Error loading module {module_path}: {e}")
+            return None
+        self.load_times[module_path] = time.perf_counter() - start
+        return module
+    
+    def _register(self, module_path: str, module):
+        """Add the handlers the module's decorators attached to its functions"""
+        handlers = []
+        for obj in vars(module).values():
+            if callable(obj) and getattr(obj, "__module__", None) == module_path:
+                for handler, group in getattr(obj, "handlers", []):
+                    self.client.add_handler(handler, group)
+                    handlers.append((handler, group))
+        self._handlers[module_path] = handlers
+        logging.info(
+            f"Module {module_path.rsplit('.', 1)[-1]} loaded successfully "
+            f"({self.load_times[module_path] * 1000:.0f} ms)"
+        )
+    
     async def load_modules(self, client: Client):
         """Load all modules from modules directory"""
+        self.client = client
         base_path = Path(__file__).parent.parent.absolute()
         modules_path = base_path / "modules"
+        start = time.perf_counter()
         
-        for filename in sorted(os.listdir(modules_path)):
-            if filename.endswith(".py") and not filename.startswith("__"):
-                try:
-                    module_name = filename[:-3]
-                    module_path = f"modules.{module_name}"
-                    
-                    spec = importlib.util.find_spec(module_path)
-                    if spec is None:
-                        continue
-                        
-                    module = importlib.import_module(module_path)
-                    importlib.reload(module)
-                    logging.info(f"Module {module_name} loaded successfully")
-                    
-                except Exception as e:
-                    logging.error(f"Error loading module {filename}: {e}")
+        builtin = self._module_paths(modules_path, "modules")
+        if profiler.profiling:
+            modules = [self._import(path) for path in builtin]
+        else:
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor(self.IMPORT_WORKERS, thread_name_prefix="import") as executor:
+                modules = await asyncio.gather(
+                    *(loop.run_in_executor(executor, self._import, path) for path in builtin)
+                )
+        # Registered in name order so handler order doesn't depend on timing
+        for module_path, module in zip(builtin, modules):
+            if module is not None:
+                self._register(module_path, module)
         
         # Load custom modules if they exist
-        custom_modules_path = os.path.join(modules_path, "custom_modules")
-        if os.path.isdir(custom_modules_path):
-            for filename in sorted(os.listdir(custom_modules_path)):
-                if filename.endswith(".py"):
-                    try:
-                        module_name = filename[:-3]
-                        module_path = f"modules.custom_modules.{module_name}"
-                        
-                        spec = importlib.util.find_spec(module_path)
-                        if spec is None:
-                            continue
-                            
-                        module = importlib.import_module(module_path)
-                        importlib.reload(module)
-                        logging.info(f"Custom module {module_name} loaded successfully")
-                        
-                    except Exception as e:
-                        logging.error(f"Error loading custom module {filename}: {e}")
+        for module_path in self._module_paths(modules_path / "custom_modules", "modules.custom_modules"):
+            module = self._import(module_path)
+            if module is not None:
+                self._register(module_path, module)
+        
+        slowest = sorted(self.load_times.items(), key=lambda item: item[1], reverse=True)[:3]
+        logging.info(
+            "Loaded %s modules in %.2fs, slowest: %s",
+            len(self._handlers),
+            time.perf_counter() - start,
+            ", ".join(f"{path.rsplit('.', 1)[-1]} {seconds * 1000:.0f} ms" for path, seconds in slowest),
+        )
                         
     async def reload_module(self, module_name: str) -> bool:
         """Reload a specific module by name"""
+        module_path = f"modules.{module_name}"
         try:
-            module_path = f"modules.{module_name}"
             if importlib.util.find_spec(module_path):
                 module = importlib.import_module(module_path)
-                importlib.reload(module)
+                for handler, group in self._handlers.pop(module_path, []):
+                    self.client.remove_handler(handler, group)
+                start = time.perf_counter()
+                module = importlib.reload(module)
+                self.load_times[module_path] = time.perf_counter() - start
+                self._register(module_path, module)
                 return True
         except Exception as e:
             logging.error(f"Error reloading {module_name}: {e}")
@@ -108,4 +163,4 @@ class HelpNavigator:
             text += f"<b>• {module_name.title()}:</b> {', '.join([f'<code>{prefix + cmd_name.split()[0]}</code>' for cmd_name in commands.keys()])}\n"
         text += f"\n<b>The number of modules in the userbot: {len(modules_help)}</b>"
         
-        await message.edit(text)
\ No newline at end of file
+        await scheduler.call("edit", message.edit, text, chat=message.chat.id)
\ No newline at end of file
@@ -0,0 +1,109 @@
+#  CybroX-UserBot - telegram userbot
+#  Copyright (C) 2025 CybroX UserBot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Imported first by main.py, so keep this module free of heavy imports
+import io
+import logging
+import time
+from contextlib import contextmanager
+
+STARTUP_PROFILE = "startup.prof"
+
+
+class BootProfiler:
+    """Measures where the time goes between launching main.py and idle
+
+    main.py wraps its imports and startup steps in phases, and module
+    import times come from ModuleManager. The last KEEP_REPORTS reports
+    are stored in the database. With --profile-startup the whole boot also
+    runs under cProfile and the statistics are written to STARTUP_PROFILE.
+    cProfile only follows the thread that enabled it, so work that would
+    normally go to other threads has to run on the main one meanwhile,
+    see profiling.
+    """
+
+    section = "core.boot"
+    KEEP_REPORTS = 10
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self.report = None
+        self._cprofile = None
+
+    def enable_cprofile(self):
+        import cProfile
+
+        self._cprofile = cProfile.Profile()
+        self._cprofile.enable()
+
+    @property
+    def profiling(self) -> bool:
+        """Whether cProfile is running and threaded work should stay serial"""
+        return self._cprofile is not None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def finish(self, module_times: dict = None) -> dict:
+        """Build the report of this boot, store it and return it"""
+        from utils.db import db
+
+        self.report = {
+            "time": time.time(),
+            "total": time.perf_counter() - self.started,
+            "phases": self.phases,
+            "modules": module_times or {},
+        }
+
+        key = f"{int(self.report['time'] * 1000):015d}"
+        db.set(self.section, key, self.report)
+        with db.transaction():
+            for old_key, _ in db.scan(self.section, offset=self.KEEP_REPORTS, reverse=True):
+                db.remove(self.section, old_key)
+
+        logging.info(
+            "Started in %.2fs: %s",
+            self.report["total"],
+            ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases),
+        )
+        if self._cprofile is not None:
+            self._dump_cprofile()
+        return self.report
+
+    def _dump_cprofile(self):
+        import pstats
+
+        self._cprofile.disable()
+        self._cprofile.dump_stats(STARTUP_PROFILE)
+        output = io.StringIO()
+        pstats.Stats(self._cprofile, stream=output).sort_stats("cumulative").print_stats(25)
+        logging.info("Startup profile saved to %s\n%s", STARTUP_PROFILE, output.getvalue())
+        self._cprofile = None
+
+    def reports(self, limit: int = None) -> list:
+        """Stored boot reports, newest first"""
+        from utils.db import db
+
+        return [report for _, report in db.scan(self.section, reverse=True, limit=limit)]
+
+
+profiler = BootProfiler()
@@ -0,0 +1,171 @@
+#  CybroX-UserBot - telegram userbot
+#  Copyright (C) 2025 CybroX UserBot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import time
+
+from pyrogram.errors import FloodWait
+
+from utils.cache import LRUCache
+
+
+class TokenBucket:
+    """Allows bursts of up to capacity, refilled at rate tokens per second"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, tokens: float = 1) -> float:
+        """Seconds until tokens can be consumed, 0 if they can be now"""
+        self._refill()
+        if self.tokens >= tokens:
+            return 0
+        if self.rate <= 0:
+            return float("inf")
+        return (tokens - self.tokens) / self.rate
+
+    def consume(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+# (burst, requests per second) for each kind of request
+METHOD_LIMITS = {
+    "send": (20, 10),
+    "edit": (20, 10),
+    "delete": (10, 5),
+    # Bans, unbans, mutes and promotions
+    "restrict": (10, 2),
+    "other": (30, 15),
+}
+CHAT_LIMIT = (10, 3)
+
+
+class RequestScheduler:
+    """Paces outgoing API calls and retries them on FloodWait
+
+    Requests are throttled per method and per chat. A FloodWait blocks
+    that method for everyone until it has passed instead of letting every
+    module hit the same error, and background requests wait while user
+    commands are queued. Pyrogram already sleeps through short waits
+    (sleep_threshold), so the errors seen here are the long ones.
+    """
+
+    USER = 0
+    BACKGROUND = 1
+
+    def __init__(self, retries: int = 3, max_wait: int = 600):
+        self.retries = retries
+        self.max_wait = max_wait
+        self._method_buckets = {
+            method: TokenBucket(*limit) for method, limit in METHOD_LIMITS.items()
+        }
+        self._chat_buckets = LRUCache(1024)
+        self._blocked_until = {}
+        self._user_waiting = 0
+
+    def blocked_for(self, method: str) -> float:
+        """Seconds left in a FloodWait backoff for method"""
+        return max(self._blocked_until.get(method, 0) - time.monotonic(), 0)
+
+    def backoff(self, method: str, seconds: float):
+        """Block method for seconds, e.g. after a FloodWait seen elsewhere"""
+        until = time.monotonic() + seconds
+        if until > self._blocked_until.get(method, 0):
+            self._blocked_until[method] = until
+            logging.warning("FloodWait: pausing %s requests for %ss", method, seconds)
+
+    def _chat_bucket(self, chat) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat)
+        if bucket is None:
+            bucket = TokenBucket(*CHAT_LIMIT)
+            self._chat_buckets.set(chat, bucket)
+        return bucket
+
+    def _take(self, method: str, chat) -> float:
+        buckets = [self._method_buckets.get(method, self._method_buckets["other"])]
+        if chat is not None:
+            buckets.append(self._chat_bucket(chat))
+        wait = max(bucket.wait_time() for bucket in buckets)
+        if wait == 0:
+            for bucket in buckets:
+                bucket.consume()
+        return wait
+
+    async def _acquire(self, method: str, chat, lane: int):
+        if lane == self.USER:
+            self._user_waiting += 1
+        try:
+            while True:
+                wait = self.blocked_for(method)
+                if wait > self.max_wait:
+                    # Fail like the FloodWait that caused it instead of
+                    # holding the caller for the whole block
+                    raise FloodWait(value=int(wait))
+                if lane == self.BACKGROUND and self._user_waiting:
+                    wait = max(wait, 0.05)
+                if wait <= 0:
+                    wait = self._take(method, chat)
+                    if wait <= 0:
+                        return
+                await asyncio.sleep(wait)
+        finally:
+            if lane == self.USER:
+                self._user_waiting -= 1
+
+    async def call(
+        self,
+        method: str,
+        func,
+        *args,
+        chat=None,
+        lane: int = USER,
+        retries: int = None,
+        **kwargs
+    ):
+        """Await func(*args, **kwargs) once the rate limits allow it
+
+        method is one of METHOD_LIMITS ("send", "edit", "delete", "restrict",
+        "other")
+        and chat is the chat id the request targets, if any. Raises
+        FloodWait at once while method is blocked for longer than max_wait.
+        """
+        retries = self.retries if retries is None else retries
+        attempt = 0
+        while True:
+            await self._acquire(method, chat, lane)
+            try:
+                return await func(*args, **kwargs)
+            except FloodWait as e:
+                self.backoff(method, e.value)
+                attempt += 1
+                if attempt > retries or e.value > self.max_wait:
+                    raise
+
+
+scheduler = RequestScheduler()
@@ -0,0 +1,142 @@
+#  CybroX-UserBot - telegram userbot
+#  Copyright (C) 2025 CybroX UserBot Organization
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+from typing import Union
+
+from pyrogram import Client, errors
+from pyrogram.types import User
+
+from utils.cache import TTLCache
+from utils.db import adb
+
+_NOT_FOUND = object()
+
+
+class UserNotFound(ValueError):
+    """Raised for a username that recently failed to resolve"""
+
+
+class UserResolver:
+    """Resolves usernames and ids to users with as few requests as possible
+
+    Resolving a username is one of the most rate limited Telegram methods,
+    so usernames are mapped to ids once and the mapping is stored in the
+    database. Users are cached by id, unknown usernames are remembered for
+    a few minutes, and concurrent lookups of the same reference share a
+    single request.
+    """
+
+    section = "core.resolver"
+    USER_TTL = 3600
+    USERNAME_TTL = 86400
+    NEGATIVE_TTL = 300
+
+    def __init__(self, maxsize: int = 4096):
+        self._users = TTLCache(maxsize, ttl=self.USER_TTL)
+        self._usernames = TTLCache(maxsize, ttl=self.USERNAME_TTL)
+        self._pending = {}
+
+    @staticmethod
+    def _normalize(user_ref: Union[int, str]) -> Union[int, str]:
+        if isinstance(user_ref, int):
+            return user_ref
+        user_ref = user_ref.strip()
+        if user_ref.lstrip("-").isdigit():
+            return int(user_ref)
+        return user_ref.lstrip("@").lower()
+
+    async def remember(self, user: User):
+        """Cache a user seen elsewhere, e.g. the sender of a replied message"""
+        self._users.set(user.id, user)
+        if user.username:
+            await self._store_username(user.username.lower(), user.id)
+
+    async def resolve(self, client: Client, user_ref: Union[int, str]) -> User:
+        """Get a user by id, "@username" or "username"
+
+        Raises the client's error for unknown users, or UserNotFound if the
+        username already failed to resolve a moment ago.
+        """
+        key = self._normalize(user_ref)
+        if isinstance(key, int):
+            user = self._users.get(key)
+            if user is not None:
+                return user
+        else:
+            user_id = self._usernames.get(key)
+            if user_id is _NOT_FOUND:
+                raise UserNotFound(f"Username @{key} not found")
+            if user_id is not None:
+                user = self._users.get(user_id)
+                if user is not None:
+                    return user
+
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(client, key))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, client: Client, key: Union[int, str]) -> User:
+        if isinstance(key, int):
+            user = await client.get_users(key)
+            await self.remember(user)
+            return user
+
+        # A stored id costs a cheap lookup by id instead of a username resolve
+        user_id = self._usernames.get(key)
+        if user_id is None:
+            user_id = await adb.aget(self.section, key)
+        if user_id is not None:
+            try:
+                user = await client.get_users(user_id)
+            except (errors.BadRequest, KeyError, ValueError):
+                user = None
+            if user is not None and user.username and user.username.lower() == key:
+                await self.remember(user)
+                return user
+            # The username moved to someone else, resolve it again
+            self._usernames.pop(key)
+            await adb.aremove(self.section, key)
+
+        try:
+            user = await client.get_users(key)
+        except (errors.BadRequest, KeyError, ValueError):
+            self._usernames.set(key, _NOT_FOUND, ttl=self.NEGATIVE_TTL)
+            raise
+        self._users.set(user.id, user)
+        await self._store_username(key, user.id)
+        return user
+
+    async def _store_username(self, username: str, user_id: int):
+        if self._usernames.get(username) == user_id:
+            return
+        self._usernames.set(username, user_id)
+        if await adb.aget(self.section, username) != user_id:
+            await adb.aset(self.section, username, user_id)
+
+    def invalidate(self, user_id: int = None):
+        """Forget one cached user, or everything if no id is given"""
+        if user_id is None:
+            self._users.clear()
+            self._usernames.clear()
+        else:
+            self._users.pop(user_id)
+
+
+resolver = UserResolver()
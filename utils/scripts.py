@@ -15,24 +15,57 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import asyncio
+import importlib
 import os
 import sys
 import traceback
+import types
 from typing import Union
 from pyrogram.types import Message
 
+from utils import config
+from utils.db import db
+from utils.ratelimit import scheduler
+
 
 async def edit_or_reply(message: Message, text: str, **kwargs):
     """Edit message if from self, reply otherwise"""
     if message.from_user and message.from_user.is_self:
-        await message.edit(text, **kwargs)
+        return await scheduler.call(
+            "edit", message.edit, text, chat=message.chat.id, **kwargs
+        )
     else:
-        await message.reply(text, **kwargs)
+        return await scheduler.call(
+            "send", message.reply, text, chat=message.chat.id, **kwargs
+        )
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access"""
+
+    def __getattr__(self, name: str):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, name)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Import a heavy library now, or on first use if LAZY_IMPORTS is set
+
+    Only use the result through attribute access (lib.func), names taken
+    from it with "from ... import" would trigger the import right away.
+    """
+    if not config.lazy_imports:
+        return importlib.import_module(name)
+    return LazyModule(name)
 
 
 def restart():
     """Restart the userbot"""
-    os.execvp(sys.executable, [sys.executable, "main.py"])
+    # execvp skips atexit handlers, so write out deferred commits first
+    db.flush()
+    # Keep flags such as --profile-startup across restarts
+    os.execvp(sys.executable, [sys.executable, "main.py", *sys.argv[1:]])
 
 
 def format_exc(e: Exception, **kwargs):
@@ -46,8 +79,10 @@ async def with_reply(message: Message) -> Union[Message, bool]:
     """Check if message has reply and return it"""
     reply = message.reply_to_message
     if not reply:
-        await message.edit("<b>Reply to message is required</b>")
+        await scheduler.call(
+            "edit", message.edit, "<b>Reply to message is required</b>", chat=message.chat.id
+        )
         await asyncio.sleep(3)
-        await message.delete()
+        await scheduler.call("delete", message.delete, chat=message.chat.id)
         return False
     return reply
\ No newline at end of file